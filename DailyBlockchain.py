@@ -8,13 +8,22 @@ from service.calculateData import process_file
 from service.caculate_ckvn import calculate_coin
 from api.crawlData import fetch_klines
 from notify.notify import tele_notification
-from config.enums import Symbols, SLEEP_INTERVAL
+from service.profiling import CycleProfiler
+from config.enums import SYMBOLS, SLEEP_INTERVAL
 
 # Global variables
 results = {}
 results_lock = threading.Lock()
 completed_count = 0
 
+# Indicator columns calculate_coin and the report read, and the trailing candles needed:
+# extract_message_from_dataframe reads df.iloc[-5:-2] and df.iloc[-2] behind a len(df) >= 6 guard
+REPORT_COLUMNS = ("ema_20", "ema_50", "rsi14", "macd", "macd_signal", "trend_score", "volume_ratio")
+REPORT_WINDOW = 6
+
+# Profiling bật/tắt lúc chạy (xem service/profiling.py)
+profiler = CycleProfiler("daily_blockchain")
+
 def save_dataframe_to_excel(df, symbol):
     """Save DataFrame to Excel file in the data directory."""
     try:
@@ -37,24 +46,25 @@ def process_symbol_data(symbol):
 
     # while True:
     try:
-        print(f"\nProcessing {symbol}...")
+        with profiler.profile("cycle", symbol):
+            print(f"\nProcessing {symbol}...")
         
-        # Fetch and process data
-        endtime = datetime(2025, 7, 16)   # 30/07/2025
-        toTs = int(endtime.timestamp())
-        raw_data = fetch_klines(symbol, '4h', 1000,toTs)
-        processed_data = process_file(raw_data, (20, 50, 90),20)
-        processed_data = calculate_coin(processed_data)
-
-        # Create DataFrame with only required columns
-        columns_to_keep = [
-            "timestamp", "close", "symbol", "trend_score", 
-            "show_indicator", "rsi_high", "vol_high", "macd_down"
-        ]
-        df = pd.DataFrame(processed_data)[columns_to_keep]
+            # Fetch and process data
+            endtime = datetime(2025, 7, 16)   # 30/07/2025
+            toTs = int(endtime.timestamp())
+            raw_data = fetch_klines(symbol, '4h', 1000,toTs)
+            processed_data = process_file(raw_data, (20, 50, 90), 20, REPORT_COLUMNS, REPORT_WINDOW)
+            processed_data = calculate_coin(processed_data)
+
+            # Create DataFrame with only required columns (report window only)
+            columns_to_keep = [
+                "timestamp", "close", "symbol", "trend_score", 
+                "show_indicator", "rsi_high", "vol_high", "macd_down"
+            ]
+            df = pd.DataFrame(processed_data).reindex(columns=columns_to_keep)  # vol_high is only set on high-volume candles
         
-        # Save DataFrame to Excel
-        save_dataframe_to_excel(df, symbol)
+            # Save DataFrame to Excel (report window only, not the full 1000-candle history)
+            save_dataframe_to_excel(df, symbol)
 
         # Update results
         with results_lock:
@@ -64,7 +74,7 @@ def process_symbol_data(symbol):
             }
             completed_count += 1
 
-            if completed_count == len(symbols):
+            if completed_count == len(SYMBOLS):
                 send_aggregated_report()
                 completed_count = 0
 
@@ -78,7 +88,7 @@ def send_aggregated_report():
     aggregated_message = f"<b>📊 Daily Report {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</b>\n"
     aggregated_message += "=" * 40 + "\n"
 
-    for symbol in symbols:
+    for symbol in SYMBOLS:
         if symbol in results and results[symbol]['message']:
             aggregated_message += f"{results[symbol]['message']}\n"
 
@@ -129,17 +139,15 @@ def extract_message_from_dataframe(df):
 
 def main():
     """Main function to start the daily blockchain data processing."""
-    global symbols
-    
-    symbols = [symbol.value for symbol in Symbols]
+    profiler.install_signal_handler()
     print("Starting daily blockchain data fetcher...")
-    print(f"Processing {len(symbols)} symbols: {', '.join(symbols)}")
+    print(f"Processing {len(SYMBOLS)} symbols: {', '.join(SYMBOLS)}")
 
     try:
         threads = []
         
         # Start a thread for each symbol
-        for symbol in symbols:
+        for symbol in SYMBOLS:
             thread = threading.Thread(
                 target=process_symbol_data, 
                 args=(symbol,), 
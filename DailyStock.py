@@ -1,68 +1,124 @@
+import json
+import sys
 import threading
 import time
 from datetime import datetime, timedelta
 import pandas as pd
+import pytz
 from api.CrawlDataCK import StockDataFetcher
-from config.enums import SYMBOL_CK, SLEEP_INTERVAL
+from config.enums import (
+    SYMBOL_CK, SLEEP_INTERVAL, REPORT_DEADLINE, INTRADAY_POLL_INTERVAL, VN_TIMEZONE,
+    CLUSTER_STOCK_BACKEND, CLUSTER_NODE_ID, CLUSTER_SHARDS, CLUSTER_LEASE_TTL,
+)
+from cluster.coordination import create_backend
+from cluster.node import ClusterNode, WorkerPool
 from notify.notify import tele_notification
-from service.calculateData import process_file
+from service.calculateData import process_buffer
+from service.candle_buffer import CandleBufferStore
 from service.caculate_ckvn import calculate_ckvn
+from service.trend_leader import detect_trend_leaders, format_leader_report
+from service.report_aggregator import CycleAggregator, format_cycle_status
+from service.profiling import CycleProfiler
+from service.paper_trading import create_trader, LONG
+from service.intraday import IntradaySession, IncrementalIndicators, intraday_signal, in_session, previous_sessions
 
 
 class DailyStockAnalyzer:
     """Handles daily stock analysis and reporting."""
+
+    # Indicator columns calculate_ckvn and the report read, and the trailing sessions (df.iloc[-8:-1])
+    REPORT_COLUMNS = ("ema_20", "ema_50", "ema_90", "rsi14", "macd", "macd_signal", "trend_score", "volume_ratio")
+    REPORT_WINDOW = 8
+    BUFFER_CAPACITY = 200  # sessions kept per symbol (covers the 200-day fetch range)
+    # Cluster mode: per-symbol trend leader results are published under this prefix next to the messages
+    LEADER_PREFIX = "leader:"
     
     def __init__(self):
+        self.candle_buffers = CandleBufferStore()
         self.results = {}
         self.results_lock = threading.Lock()
-        self.completed_count = 0
+        self.aggregator = CycleAggregator(SYMBOL_CK, REPORT_DEADLINE, self._send_aggregated_report)
+        self.profiler = CycleProfiler("daily_stock")
+        self.paper_trader = create_trader()
+        self.cluster_node = None  # ClusterNode when CLUSTER_STOCK_BACKEND is set
+        self.workers = WorkerPool(self.process_symbol)
 
     @staticmethod
-    def calculate_date_range():
-        """Calculate date range for stock data fetching (last 1200 days)."""
+    def calculate_date_range(since=None):
+        """Calculate date range for stock data fetching (last 200 days, or from `since` epoch)."""
         to_date = datetime.now().strftime('%d/%m/%Y')
-        from_date = (datetime.now() - timedelta(days=200)).strftime('%d/%m/%Y')
+        start = datetime.fromtimestamp(since) if since else datetime.now() - timedelta(days=200)
+        from_date = start.strftime('%d/%m/%Y')
         return from_date, to_date
 
-    def process_symbol(self, symbol):
-        """Process a single stock symbol continuously with while loop."""
-        while True:
+    def process_symbol(self, symbol, stop, delay=0):
+        """Process a single stock symbol continuously until `stop` is set (symbol moved to another node)."""
+        buffer = self.candle_buffers.get(symbol, "1d", self.BUFFER_CAPACITY)
+        if stop.wait(delay):
+            return
+        while not stop.is_set():
             try:
-                print(f"\nProcessing {symbol}...")
-                fetcher = StockDataFetcher()
-                from_date, to_date = self.calculate_date_range()
-                
-                # Fetch and process stock data
-                data = fetcher.fetch_stock_data(symbol, from_date, to_date, 1, 1000)
-                data.reverse()  # Reverse for chronological order
-                processed_data = process_file(data, (20, 50, 90),50)
-                processed_data = calculate_ckvn(processed_data)
-
-                # Create DataFrame with required columns
-                df = pd.DataFrame(processed_data)
-                columns_to_keep = [
-                    "timestamp", "close", "symbol", "trend_score", "show_indicator",
-                    "rsi_high", "vol_high", "ema_20", "ema_50", "ema_90"
-                ]
-                df = df[columns_to_keep]
+                with self.profiler.profile("cycle", symbol):
+                    print(f"\nProcessing {symbol}...")
+                    self._refresh_daily(StockDataFetcher(), symbol, buffer)
+                    processed_data = process_buffer(buffer, (20, 50, 90), 50, self.REPORT_COLUMNS, self.REPORT_WINDOW)
+                    processed_data = calculate_ckvn(processed_data)
+
+                    # Create DataFrame with required columns
+                    df = pd.DataFrame(processed_data)
+                    columns_to_keep = [
+                        "timestamp", "close", "symbol", "trend_score", "show_indicator",
+                        "rsi_high", "vol_high", "ema_20", "ema_50", "ema_90"
+                    ]
+                    df = df[columns_to_keep]
                 
                 # Store results
+                message = self._extract_message_from_dataframe(df)
                 with self.results_lock:
                     self.results[symbol] = {
-                        "message": self._extract_message_from_dataframe(df),
+                        "message": message,
+                        "candles": buffer,
                         "timestamp": datetime.now()
                     }
-                    self.completed_count += 1
-                    
-                    # Send report when all symbols are processed
-                    if self.completed_count == len(SYMBOL_CK):
-                        self._send_aggregated_report()
-                        self.completed_count = 0
+
+                # Cycle = last closed session; report goes out when all symbols arrive or at the deadline.
+                # The key is SSI's trading date string, identical on every node whatever the host time zone.
+                cycle = processed_data[-2]["timestamp"]
+                if self.cluster_node:
+                    self._publish(cycle, symbol, message, buffer)
+                    self.aggregator.submit_many(cycle, self.cluster_node.collect(cycle))
+                else:
+                    self.aggregator.submit(cycle, symbol, message)
+                self._paper_trade(symbol, processed_data[-2], message)
                         
             except Exception as e:
                 print(f"Error processing {symbol}: {e}")
+                self.aggregator.fail(symbol, e)
             
-            time.sleep(SLEEP_INTERVAL)
+            stop.wait(SLEEP_INTERVAL)
+
+    def _publish(self, cycle, symbol, message, buffer):
+        """Cluster mode: publish the message and this symbol's trend leader result (it only depends on its own candles)."""
+        self.cluster_node.publish(cycle, symbol, message)
+        leader = detect_trend_leaders([symbol], {symbol: buffer}).get(symbol)
+        payload = {"label": leader["label"], "move": leader["move"]} if leader else {"label": ""}
+        self.cluster_node.publish(cycle, self.LEADER_PREFIX + symbol, json.dumps(payload))
+
+    def _paper_trade(self, symbol, closed, message):
+        """Track stops on the last closed session; open a long on an uptrend message (no shorting stocks)."""
+        if not self.paper_trader:
+            return
+        self.paper_trader.on_bar(symbol, closed)
+        if message.startswith("👉"):
+            reason = message.split("\n", 1)[0].replace("<b>", "").replace("</b>", "")
+            self.paper_trader.on_signal(symbol, LONG, float(closed["close"]), closed["timestamp"], "daily_stock", reason)
+
+    def _refresh_daily(self, fetcher, symbol, buffer):
+        """Fetch daily candles from the last buffered session onwards into the buffer."""
+        from_date, to_date = self.calculate_date_range(buffer.last_timestamp)
+        data = fetcher.fetch_stock_data(symbol, from_date, to_date, 1, 1000)
+        data.reverse()  # Reverse for chronological order
+        buffer.extend(data)
 
     def _extract_message_from_dataframe(self, df):
         """Extract trend analysis message from processed dataframe."""
@@ -112,16 +168,28 @@ class DailyStockAnalyzer:
         message += f"\nRSI: {rsi_values}\nVol: {vol_values}\n"
         return message
 
-    def _send_aggregated_report(self):
-        """Send aggregated report via Telegram notification."""
+    def _send_aggregated_report(self, cycle, messages, missing, stale, errors):
+        """Send aggregated report via Telegram notification (called once per cycle by the aggregator)."""
+        if self.cluster_node and not self.cluster_node.claim_report(cycle):
+            return  # another node in the cluster already sent this cycle's report
+
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         aggregated_message = f"<b>📈 Daily Stock Report {current_time}</b>\n"
         aggregated_message += "=" * 40 + "\n"
 
         # Collect all meaningful messages
         for symbol in SYMBOL_CK:
-            if symbol in self.results and self.results[symbol]['message']:
-                aggregated_message += f"{self.results[symbol]['message']}\n"
+            if messages.get(symbol):
+                aggregated_message += f"{messages[symbol]}\n"
+
+        try:
+            leader_message = format_leader_report(self._leader_results(messages))
+        except Exception as e:
+            print(f"Error detecting trend leaders: {e}")
+            leader_message = ""
+        if leader_message:
+            aggregated_message += "=" * 40 + "\n" + leader_message
+        aggregated_message += format_cycle_status(missing, stale, errors)
 
         # Send notification if there's meaningful content
         if aggregated_message.count('\n') > 2:
@@ -129,36 +197,112 @@ class DailyStockAnalyzer:
         else:
             print("\nNo significant stock data to send in the report.")
 
+    def _leader_results(self, messages):
+        """Trend leader / down leader for the report: published per symbol in cluster mode, else one local pass."""
+        if self.cluster_node:
+            published = {
+                key[len(self.LEADER_PREFIX):]: json.loads(value)
+                for key, value in messages.items() if key.startswith(self.LEADER_PREFIX) and value
+            }
+            return {s: published[s] for s in SYMBOL_CK if s in published}
+
+        # Whole universe in one pass. Runs on the aggregator's timer thread while workers keep writing:
+        # snapshot results and buffers first.
+        with self.results_lock:
+            buffers = {s: r["candles"] for s, r in self.results.items() if r.get("candles")}
+        candles_by_symbol = {s: buffer.snapshot() for s, buffer in buffers.items()}
+        return detect_trend_leaders(SYMBOL_CK, candles_by_symbol)
+
     def run_daily_analysis(self):
         """Start continuous stock analysis with threads for all symbols."""
         print("Starting continuous daily stock analysis...")
         
-        # Reset counters and results
-        self.completed_count = 0
+        # Reset results
         self.results = {}
         
-        # Start threads for all symbols (continuous processing)
-        threads = []
-        for symbol in SYMBOL_CK:
-            thread = threading.Thread(target=self.process_symbol, args=(symbol,), daemon=False)
-            thread.start()
-            threads.append(thread)
-            time.sleep(1)  # Small delay between thread starts
-        
-        # Join threads (they run continuously)
-        for thread in threads:
-            thread.join()
+        # One worker thread per symbol this node handles (all of SYMBOL_CK unless clustered)
+        if CLUSTER_STOCK_BACKEND:
+            self.cluster_node = ClusterNode(
+                create_backend(CLUSTER_STOCK_BACKEND), CLUSTER_NODE_ID, CLUSTER_SHARDS, CLUSTER_LEASE_TTL,
+                on_change=lambda shards: self.workers.sync(self.cluster_node.owned_symbols(SYMBOL_CK)),
+            )
+            self.aggregator.collect = self.cluster_node.collect
+            print(f"Cluster mode, node {CLUSTER_NODE_ID}")
+            self.cluster_node.start()
+        else:
+            self.workers.sync(SYMBOL_CK)
+
+        # Workers run in background threads (added/removed on rebalance); the main thread only waits
+        try:
+            while True:
+                time.sleep(60)
+        finally:
+            if self.cluster_node:
+                self.cluster_node.stop()
+            self.workers.stop()
+
+    def run_intraday_analysis(self):
+        """Poll SSI intraday bars during the session and alert on same-session signals."""
+        print("Starting intraday stock analysis...")
+        fetcher = StockDataFetcher()
+        sessions = {}
+        indicators = {}
+
+        while True:
+            now = datetime.now(pytz.timezone(VN_TIMEZONE)).replace(tzinfo=None)
+            if not in_session(now):
+                time.sleep(INTRADAY_POLL_INTERVAL)
+                continue
+
+            trading_date = now.strftime('%d/%m/%Y')
+            messages = ""
+            for symbol in SYMBOL_CK:
+                try:
+                    with self.profiler.profile("intraday", symbol):
+                        session = sessions.get(symbol)
+                        if session is None or session.trading_date != now.date():
+                            # New session: refresh daily history once, freeze indicator state at the previous close
+                            buffer = self.candle_buffers.get(symbol, "1d", self.BUFFER_CAPACITY)
+                            self._refresh_daily(fetcher, symbol, buffer)
+                            history = previous_sessions(buffer, now)
+                            indicators[symbol] = IncrementalIndicators(
+                                *(buffer.view(field)[:history] for field in ("close", "high", "low", "volume"))
+                            )
+                            session = sessions[symbol] = IntradaySession(symbol, now.date())
+
+                        # Delta fetch: the last received bar (it may have been still forming) and anything after it
+                        new_bars, session.seen = fetcher.fetch_intraday_delta(symbol, trading_date, session.seen)
+                        if session.add_bars(new_bars):
+                            messages += intraday_signal(symbol, session, indicators[symbol], now)
+                except Exception as e:
+                    print(f"Error processing intraday {symbol}: {e}")
+
+            if messages:
+                tele_notification(f"<b>⚡ Intraday Stock Signals {now.strftime('%Y-%m-%d %H:%M')}</b>\n" + "=" * 40 + "\n" + messages)
+
+            time.sleep(INTRADAY_POLL_INTERVAL)
 
 
 def run_daily_stock_job():
     analyzer = DailyStockAnalyzer()
+    analyzer.profiler.install_signal_handler()
     analyzer.run_daily_analysis()
 
 
+def run_intraday_stock_job():
+    analyzer = DailyStockAnalyzer()
+    analyzer.profiler.install_signal_handler()
+    analyzer.run_intraday_analysis()
+
+
 if __name__ == "__main__":
     print("Starting daily stock analysis service...")
     
     try:
-        run_daily_stock_job()
+        # python DailyStock.py intraday -> same-session signals from SSI intraday bars
+        if len(sys.argv) > 1 and sys.argv[1] == "intraday":
+            run_intraday_stock_job()
+        else:
+            run_daily_stock_job()
     except KeyboardInterrupt:
         print("\nStopping the system...")
\ No newline at end of file
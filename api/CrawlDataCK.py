@@ -76,4 +76,67 @@ class StockDataFetcher:
             raw_data = response.json()
             return self.format_stock_data(raw_data, symbol)
         else:
-            raise Exception(f"Failed to fetch stock data: {response.status_code}, {response.text}")
\ No newline at end of file
+            raise Exception(f"Failed to fetch stock data: {response.status_code}, {response.text}")
+
+    def format_intraday_data(self, raw_data, symbol):
+        """Bar 1 phút trong phiên, timestamp là giờ Việt Nam"""
+        formatted_data = []
+        for bar in raw_data.get('data', []):
+            try:
+                trading_time = datetime.strptime(f"{bar.get('TradingDate', '')} {bar.get('Time', '')}", '%d/%m/%Y %H:%M:%S')
+                formatted_data.append({
+                    'timestamp': trading_time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'open': float(bar.get('Open', 0)),
+                    'high': float(bar.get('High', 0)),
+                    'low': float(bar.get('Low', 0)),
+                    'close': float(bar.get('Close', 0)),
+                    'volume': float(bar.get('Volume', 0)),
+                    'symbol': symbol
+                })
+            except (ValueError, KeyError) as e:
+                print(f"Error formatting intraday bar: {e}")
+        return formatted_data
+
+    def fetch_intraday_page(self, symbol, trading_date, page_index=1, page_size=1000):
+        """Các dòng thô (chưa format) của 1 trang bar 1 phút trong ngày (dd/mm/yyyy), tăng dần theo thời gian"""
+        url = f"https://fc-data.ssi.com.vn/api/v2/Market/IntradayOhlc"
+        headers = {
+            'Authorization': f"Bearer {self.token_service.get_access_token()}"
+        }
+        params = {
+            'symbol': symbol,
+            'fromDate': trading_date,
+            'toDate': trading_date,
+            'pageIndex': page_index,
+            'pageSize': page_size,
+            'ascending': True,
+            'resollution': 1  # tên tham số theo SSI API
+        }
+
+        response = requests.get(url, headers=headers, params=params)
+        if response.status_code == 200:
+            return response.json().get('data') or []
+        else:
+            raise Exception(f"Failed to fetch intraday data: {response.status_code}, {response.text}")
+
+    def fetch_intraday_data(self, symbol, trading_date, page_index=1, page_size=1000):
+        """Bar 1 phút của một ngày giao dịch (dd/mm/yyyy), sắp xếp tăng dần theo thời gian"""
+        return self.format_intraday_data({'data': self.fetch_intraday_page(symbol, trading_date, page_index, page_size)}, symbol)
+
+    def fetch_intraday_delta(self, symbol, trading_date, seen, page_size=1000):
+        """
+        Bar mới sau `seen` dòng đã nhận trong ngày, lấy lại cả dòng cuối đã nhận (bar phút đó có thể
+        còn đang chạy lúc lấy trước) -> mỗi lần poll chỉ tải thêm tối đa 1 trang cũ.
+        Trả về (bar đã format, tổng số dòng thô đã nhận): đếm theo dòng thô vì format bỏ dòng lỗi.
+        """
+        start = max(seen - 1, 0)
+        page_index = start // page_size + 1
+        skip = start % page_size
+        rows = []
+        while True:
+            page = self.fetch_intraday_page(symbol, trading_date, page_index, page_size)
+            rows.extend(page[skip:])
+            if len(page) < page_size:
+                return self.format_intraday_data({'data': rows}, symbol), start + len(rows)
+            page_index += 1
+            skip = 0
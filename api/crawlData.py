@@ -1,68 +1,59 @@
-import requests
-from datetime import datetime
-from config.enums import SYMBOLS
+import time
+from api.sources import CryptoCompareSource, BinanceSource
+from api.hedged_fetch import HedgedFetcher
+from api.fetch_cache import SingleFlightCache, SQLiteStore
+from config.enums import SYMBOLS, INTERVAL_SECONDS, KLINE_CACHE_SIZE, KLINE_CACHE_TTL, KLINE_STORE_PATH
 
-def fetch_klines(symbol: str, interval: str = '1d', limit: int = 200, to_timestamp: int = None):
+# CryptoCompare là nguồn chính, Binance klines dùng để hedge và đối chiếu giá
+CRYPTO_FETCHER = HedgedFetcher([CryptoCompareSource(), BinanceSource()])
+CRYPTO_SOURCE = "crypto-hedged"
+
+# Request trùng (source, symbol, interval, cửa sổ) dùng chung 1 lần gọi API;
+# cửa sổ đã đóng được lưu ra KLINE_STORE_PATH cho các tiến trình khác / lần chạy sau (file tạo khi ghi lần đầu)
+KLINE_CACHE = SingleFlightCache(KLINE_CACHE_SIZE, KLINE_CACHE_TTL, SQLiteStore(KLINE_STORE_PATH) if KLINE_STORE_PATH else None)
+
+def fetch_klines(symbol: str, interval: str = '1d', limit: int = 200, to_timestamp: int = None, source: str = None):
     """
-    Lấy dữ liệu klines từ CryptoCompare API và trả về list of dicts.
-    Mỗi dict gồm: timestamp, open, high, low, close, volume, symbol
+    Lấy dữ liệu klines (CryptoCompare + Binance, hedged request) và trả về list of dicts.
+    Mỗi dict gồm: timestamp, open, high, low, close, volume, symbol, source
     Hỗ trợ các interval: 1h, 4h, 1d
+    `source`: nguồn ưu tiên (nguồn của lịch sử đã có), nguồn khác chỉ thắng khi nguồn này chậm/lỗi
     """
-    
-    # Map interval sang endpoint và aggregate value
-    if interval == '4h':
-        endpoint = 'histohour'
-        aggregate = 4
-    elif interval == '1d':
-        endpoint = 'histoday'
-        aggregate = 1
-    else:
-        endpoint = 'histohour'
-        aggregate = 4
-    
-    base_url = f"https://min-api.cryptocompare.com/data/v2/{endpoint}"
-    
-    params = {
-        'fsym': symbol,
-        'tsym': 'USDT',
-        'limit': limit,
-        'aggregate': aggregate
-    }
-    
-    # Thêm toTs nếu được cung cấp
-    if to_timestamp:
-        params['toTs'] = to_timestamp
-    
+    if interval not in INTERVAL_SECONDS:
+        # Không hỏi nguồn: interval sai là lỗi của caller, không tính là nguồn lỗi trong HedgedFetcher
+        raise ValueError(f"Interval không hỗ trợ: {interval}")
+    step = INTERVAL_SECONDS[interval]
+    if to_timestamp is not None:
+        # Căn theo mốc mở nến: nguồn trả cùng các nến (mở <= to_timestamp), mọi to_timestamp trong cùng nến chung 1 key
+        to_timestamp = to_timestamp // step * step
+    # Cửa sổ kết thúc trước lần đóng nến gần nhất -> dữ liệu không đổi nữa, cache không hết hạn
+    closed = to_timestamp is not None and to_timestamp // step < time.time() // step
+
     try:
-        response = requests.get(base_url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        
-        raw_data = data['Data']['Data']
-        
-        # Chuyển đổi sang format mong muốn
-        result = []
-        for candle in raw_data:
-            result.append({
-                'timestamp': datetime.fromtimestamp(candle['time']).strftime('%Y-%m-%d %H:%M:%S'),
-                'open': float(candle['open']),
-                'high': float(candle['high']),
-                'low': float(candle['low']),
-                'close': float(candle['close']),
-                'volume': float(candle['volumeto']),  # Volume in USDT
-                'symbol': symbol + 'USDT'
-            })
-        return result
-        
-    except requests.exceptions.Timeout:
-        print(f" Timeout khi lấy dữ liệu {symbol}")
-        return []
-    except requests.exceptions.RequestException as e:
-        print(f" Lỗi request cho {symbol}: {e}")
-        return []
-    except KeyError as e:
-        print(f" Lỗi parse data cho {symbol}: {e}")
+        if closed:
+            # Key không gồm limit: cửa sổ đã lưu dài hơn phục vụ mọi cửa sổ ngắn hơn cùng mốc cuối
+            window = KLINE_CACHE.get(
+                (CRYPTO_SOURCE, source, symbol, interval, to_timestamp),
+                lambda: _fetch_window(symbol, interval, limit, to_timestamp, source),
+                final=True,
+                accept=lambda window: isinstance(window, dict) and window["limit"] >= limit,
+            )
+            candles = window["candles"][-(limit + 1):] if window else []
+        else:
+            key = (CRYPTO_SOURCE, source, symbol, interval, limit, to_timestamp)
+            candles = KLINE_CACHE.get(key, lambda: CRYPTO_FETCHER.fetch(symbol, interval, limit, to_timestamp, source))
+    except TimeoutError as e:
+        print(f" Timeout khi lấy dữ liệu {symbol}: {e}")
         return []
     except Exception as e:
         print(f" Lỗi không xác định cho {symbol}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+    # Copy từng nến: các consumer ghi thêm cột indicator vào dict
+    return [dict(candle) for candle in candles]
+
+
+def _fetch_window(symbol, interval, limit, to_timestamp, source):
+    """Cửa sổ đã đóng kèm limit đã fetch (để biết phục vụ được limit nào), None nếu nguồn không trả nến"""
+    candles = CRYPTO_FETCHER.fetch(symbol, interval, limit, to_timestamp, source)
+    return {"limit": limit, "candles": candles} if candles else None
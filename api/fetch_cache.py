@@ -0,0 +1,158 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+
+class _Call:
+    """Một lời gọi đang chạy, các thread trùng key chờ trên event"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SQLiteStore:
+    """
+    Lưu entry final ra một file SQLite dùng chung giữa các tiến trình (main.py, DailyBlockchain.py, ...)
+    và giữa các lần chạy. Key / value phải serialize được bằng JSON. Giữ khoảng `max_entries` entry mới nhất
+    (dọn sau mỗi `prune_every` lần ghi). File chỉ được tạo ở lần đọc / ghi đầu tiên.
+    """
+
+    def __init__(self, path, max_entries=5000, prune_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._ready = False
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Mỗi lời gọi một connection (an toàn khi nhiều thread / tiến trình dùng chung file), đóng ngay sau khi dùng
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, created_at REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries (created_at)")
+            self._ready = True
+        return conn
+
+    def get(self, key):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (json.dumps(key),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (json.dumps(key), json.dumps(value), time.time()))
+            if prune:
+                # Xóa theo index created_at: entry cũ hơn entry thứ max_entries tính từ mới nhất
+                conn.execute(
+                    "DELETE FROM entries WHERE created_at < "
+                    "(SELECT created_at FROM entries ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                    (self.max_entries - 1,),
+                )
+
+
+class SingleFlightCache:
+    """
+    Cache LRU + TTL có single-flight: nhiều thread gọi cùng key cùng lúc chỉ tạo 1 request,
+    các thread còn lại chờ và dùng chung kết quả.
+    Entry `final=True` (dữ liệu không còn thay đổi, vd: cửa sổ nến đã đóng) không hết hạn,
+    chỉ bị loại khi LRU đầy; nếu có `store` (vd: SQLiteStore) entry final còn được ghi ra
+    store để tiến trình khác / lần chạy sau dùng lại mà không gọi API.
+    `accept(value)` (tùy chọn): value đã có chỉ được dùng nếu accept trả True, nếu không thì fetch
+    lại và thay thế (vd: cửa sổ nến dài hơn phục vụ mọi cửa sổ ngắn hơn cùng mốc cuối).
+    """
+
+    def __init__(self, maxsize=512, ttl=60, store=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()  # key -> (expires_at hoặc None, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.store_hits = 0
+
+    def get(self, key, fetch, final=False, accept=None):
+        """Trả về value trong cache, hoặc gọi fetch() (1 lần cho mọi thread cùng key)"""
+        usable = lambda value: value is not None and (accept is None or accept(value))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (entry[0] is None or entry[0] > time.monotonic()) and usable(entry[1]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            if call.value is None or usable(call.value):
+                return call.value
+            return self.get(key, fetch, final, accept)  # kết quả của lời gọi đang chạy không đủ cho caller này
+
+        try:
+            call.value = self._load(key) if final else None
+            if usable(call.value):
+                with self._lock:
+                    self.store_hits += 1
+            else:
+                call.value = fetch()
+                if final and call.value:
+                    self._save(key, call.value)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and call.value:
+                    self._store(key, call.value, final)
+            call.event.set()
+        return call.value
+
+    def _load(self, key):
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(key)
+        except Exception as e:
+            print(f" Lỗi đọc cache trên đĩa: {e}")
+            return None
+
+    def _save(self, key, value):
+        if self.store is None:
+            return
+        try:
+            self.store.put(key, value)
+        except Exception as e:
+            print(f" Lỗi ghi cache ra đĩa: {e}")
+
+    def _store(self, key, value, final):
+        self._entries[key] = (None if final else time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "store_hits": self.store_hits}
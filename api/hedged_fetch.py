@@ -0,0 +1,139 @@
+"""
+Fetch klines từ nhiều nguồn với hedged request:
+gửi tới nguồn nhanh nhất còn khỏe, nếu quá ngưỡng latency (percentile) mà chưa có kết quả
+thì gửi thêm tới nguồn kế tiếp; kết quả hợp lệ đầu tiên thắng. Kết quả về sau được
+đối chiếu (cross-validate) với kết quả thắng, không chặn người gọi.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+HEDGE_PERCENTILE = 0.9       # hedge khi chờ lâu hơn p90 latency của nguồn đang chờ
+DEFAULT_HEDGE_DELAY = 2.0    # seconds, khi chưa đủ mẫu latency
+MIN_HEDGE_DELAY = 0.2        # seconds
+MIN_SAMPLES = 5
+LATENCY_HISTORY = 100
+MAX_FAILURES = 3             # lỗi liên tiếp >= ngưỡng -> nguồn bị đẩy xuống cuối
+PRICE_TOLERANCE = 0.01       # lệch giá đóng cửa > 1% giữa 2 nguồn -> cảnh báo
+
+
+class HedgedFetcher:
+    def __init__(self, sources, timeout=30, max_workers=32):
+        self.sources = list(sources)
+        self.timeout = timeout
+        self._latencies = {s.name: deque(maxlen=LATENCY_HISTORY) for s in self.sources}
+        self._failures = {s.name: 0 for s in self.sources}
+        self.mismatches = {s.name: 0 for s in self.sources}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kline-fetch")
+
+    def fetch(self, symbol, interval='1d', limit=200, to_timestamp=None, prefer=None):
+        """
+        Trả về nến của nguồn hợp lệ đầu tiên; raise nếu mọi nguồn đều lỗi/hết timeout.
+        `prefer`: tên nguồn được hỏi trước nếu còn khỏe (giữ lịch sử đã có cùng một nguồn).
+        """
+        ordered = self._ordered(prefer)
+        pending = {}
+        next_index = 0
+        deadline = time.monotonic() + self.timeout
+        errors = []
+
+        def launch():
+            nonlocal next_index
+            source = ordered[next_index]
+            next_index += 1
+            future = self._executor.submit(self._timed_fetch, source, symbol, interval, limit, to_timestamp)
+            pending[future] = source
+
+        launch()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Chờ tới ngưỡng hedge của nguồn mới nhất, hoặc tới timeout nếu hết nguồn để hedge
+            wait_for = self._hedge_delay(ordered[next_index - 1]) if next_index < len(ordered) else remaining
+            done, _ = wait(pending, timeout=min(wait_for, remaining), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    candles = future.result()
+                except Exception as e:
+                    errors.append(f"{source.name}: {e}")
+                    continue
+                # Kết quả thắng: đối chiếu với các request còn đang chạy khi chúng xong
+                for other_future, other in pending.items():
+                    other_future.add_done_callback(
+                        lambda f, other=other: self._cross_validate(symbol, source.name, candles, other.name, f)
+                    )
+                return candles
+
+            # Hết ngưỡng chờ hoặc nguồn vừa lỗi -> gửi thêm request tới nguồn kế tiếp
+            if next_index < len(ordered):
+                launch()
+
+        raise TimeoutError(f"Không lấy được klines {symbol} từ nguồn nào: {'; '.join(errors) or 'timeout'}")
+
+    def _timed_fetch(self, source, symbol, interval, limit, to_timestamp):
+        start = time.monotonic()
+        try:
+            candles = source.fetch(symbol, interval, limit, to_timestamp)
+            self._validate(candles)
+        except Exception:
+            with self._lock:
+                self._failures[source.name] += 1
+            raise
+        with self._lock:
+            self._latencies[source.name].append(time.monotonic() - start)
+            self._failures[source.name] = 0
+        return candles
+
+    @staticmethod
+    def _validate(candles):
+        if not candles:
+            raise ValueError("dữ liệu rỗng")
+        if any(c['close'] <= 0 for c in candles):
+            raise ValueError("giá đóng cửa không hợp lệ")
+        if any(a['timestamp'] >= b['timestamp'] for a, b in zip(candles, candles[1:])):
+            raise ValueError("timestamp không tăng dần")
+
+    def _ordered(self, prefer=None):
+        """Nguồn khỏe trước, trong đó nguồn `prefer` rồi nguồn có median latency thấp hơn trước"""
+        with self._lock:
+            def key(source):
+                samples = sorted(self._latencies[source.name])
+                median = samples[len(samples) // 2] if samples else 0
+                return self._failures[source.name] >= MAX_FAILURES, source.name != prefer, median
+            return sorted(self.sources, key=key)
+
+    def _hedge_delay(self, source):
+        with self._lock:
+            samples = sorted(self._latencies[source.name])
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, samples[min(int(len(samples) * HEDGE_PERCENTILE), len(samples) - 1)])
+
+    def _cross_validate(self, symbol, winner_name, winner_candles, other_name, other_future):
+        """So giá đóng cửa các nến trùng timestamp giữa 2 nguồn (bỏ nến cuối đang chạy)"""
+        try:
+            other_candles = other_future.result()
+        except Exception:
+            return
+        closes = {c['timestamp']: c['close'] for c in winner_candles[:-1]}
+        diffs = [abs(c['close'] / closes[c['timestamp']] - 1) for c in other_candles if c['timestamp'] in closes]
+        if diffs and max(diffs) > PRICE_TOLERANCE:
+            with self._lock:
+                self.mismatches[other_name] += 1
+            print(f" Cảnh báo: giá {symbol} lệch {max(diffs) * 100:.2f}% giữa {winner_name} và {other_name}")
+
+    def stats(self):
+        """Latency p50/p99, lỗi liên tiếp và số lần lệch giá theo nguồn"""
+        with self._lock:
+            result = {}
+            for name, latencies in self._latencies.items():
+                samples = sorted(latencies)
+                pick = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)] if samples else None
+                result[name] = {"p50": pick(0.5), "p99": pick(0.99), "failures": self._failures[name],
+                                "mismatches": self.mismatches[name]}
+            return result
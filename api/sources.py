@@ -0,0 +1,138 @@
+"""
+Các nguồn dữ liệu klines. Mỗi nguồn trả về list dict cùng format với fetch_klines:
+timestamp, open, high, low, close, volume (theo USDT), symbol, source. Lỗi thì raise, không trả [].
+
+Volume không so sánh được giữa các nguồn (CryptoCompare: CCCAGG gộp nhiều sàn, Binance: chỉ
+Binance), nên mỗi nến ghi tên nguồn để consumer không trộn lịch sử của 2 nguồn.
+"""
+import random
+import time
+from datetime import datetime
+
+import requests
+
+from config.enums import INTERVAL_SECONDS
+
+REQUEST_TIMEOUT = 30
+
+
+class KlineSource:
+    name = "base"
+
+    def fetch(self, symbol, interval='1d', limit=200, to_timestamp=None):
+        raise NotImplementedError
+
+
+class CryptoCompareSource(KlineSource):
+    name = "cryptocompare"
+    # interval -> (endpoint, aggregate), cùng khung nến với BinanceSource
+    INTERVALS = {'1h': ('histohour', 1), '4h': ('histohour', 4), '1d': ('histoday', 1)}
+
+    def fetch(self, symbol, interval='1d', limit=200, to_timestamp=None):
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Interval không hỗ trợ: {interval}")
+        endpoint, aggregate = self.INTERVALS[interval]
+
+        base_url = f"https://min-api.cryptocompare.com/data/v2/{endpoint}"
+
+        params = {
+            'fsym': symbol,
+            'tsym': 'USDT',
+            'limit': limit,
+            'aggregate': aggregate
+        }
+
+        # Thêm toTs nếu được cung cấp
+        if to_timestamp:
+            params['toTs'] = to_timestamp
+
+        response = requests.get(base_url, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        raw_data = response.json()['Data']['Data']
+
+        return [{
+            'timestamp': datetime.fromtimestamp(candle['time']).strftime('%Y-%m-%d %H:%M:%S'),
+            'open': float(candle['open']),
+            'high': float(candle['high']),
+            'low': float(candle['low']),
+            'close': float(candle['close']),
+            'volume': float(candle['volumeto']),  # Volume in USDT
+            'symbol': symbol + 'USDT',
+            'source': self.name
+        } for candle in raw_data]
+
+
+class BinanceSource(KlineSource):
+    """Binance-compatible /api/v3/klines (Binance, các mirror hoặc sàn dùng cùng API)"""
+    name = "binance"
+    MAX_LIMIT = 1000
+    INTERVALS = ('1h', '4h', '1d')
+
+    def __init__(self, base_url="https://api.binance.com"):
+        self.base_url = base_url
+
+    def fetch(self, symbol, interval='1d', limit=200, to_timestamp=None):
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Interval không hỗ trợ: {interval}")
+        params = {
+            'symbol': symbol + 'USDT',
+            'interval': interval,
+            # CryptoCompare trả về limit + 1 nến, giữ cùng số nến giữa các nguồn
+            'limit': min(limit + 1, self.MAX_LIMIT),
+        }
+        if to_timestamp:
+            params['endTime'] = to_timestamp * 1000
+
+        response = requests.get(f"{self.base_url}/api/v3/klines", params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+
+        return [{
+            'timestamp': datetime.fromtimestamp(k[0] / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+            'open': float(k[1]),
+            'high': float(k[2]),
+            'low': float(k[3]),
+            'close': float(k[4]),
+            'volume': float(k[7]),  # Quote asset volume (USDT)
+            'symbol': symbol + 'USDT',
+            'source': self.name
+        } for k in response.json()]
+
+
+class SimulatedSource(KlineSource):
+    """
+    Nguồn giả lập để test hedging / cross-validation không cần mạng:
+    latency ngẫu nhiên (median `latency`, đuôi dài theo `tail_ratio`), tỉ lệ lỗi `fail_rate`,
+    giá lệch `bias` (vd 0.05 = cao hơn 5%) để giả lập nguồn sai.
+    Giá là random walk cố định theo symbol nên các nguồn cùng symbol trùng nhau.
+    """
+
+    def __init__(self, name, latency=0.05, tail_ratio=0.0, tail_latency=1.0, fail_rate=0.0, bias=0.0, seed=None):
+        self.name = name
+        self.latency = latency
+        self.tail_ratio = tail_ratio
+        self.tail_latency = tail_latency
+        self.fail_rate = fail_rate
+        self.bias = bias
+        self._random = random.Random(seed)
+
+    def fetch(self, symbol, interval='1d', limit=200, to_timestamp=None):
+        slow = self._random.random() < self.tail_ratio
+        time.sleep(self.tail_latency if slow else self._random.uniform(0.5, 1.5) * self.latency)
+        if self._random.random() < self.fail_rate:
+            raise requests.exceptions.ConnectionError("simulated failure")
+
+        step = INTERVAL_SECONDS.get(interval, INTERVAL_SECONDS['4h'])
+        end = int(to_timestamp or time.time()) // step * step
+        candles = []
+        for i in range(limit + 1):
+            ts = end - (limit - i) * step
+            walk = random.Random(f"{symbol}{ts}")
+            close = (100 + (ts // step) % 50) * (1 + walk.uniform(-0.01, 0.01)) * (1 + self.bias)
+            candles.append({
+                'timestamp': datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'),
+                'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+                'volume': walk.uniform(1e5, 1e6),
+                'symbol': symbol + 'USDT',
+                'source': self.name
+            })
+        return candles
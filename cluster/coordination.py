@@ -0,0 +1,195 @@
+"""
+Backend điều phối giữa các node: heartbeat, lease theo shard và nơi gom kết quả.
+
+- SQLiteBackend: một file SQLite dùng chung (chạy local / nhiều tiến trình cùng máy / NFS).
+- FileLockBackend: một file JSON bảo vệ bằng flock, cho test local không cần SQLite.
+Backend khác (Redis, etcd, ...) chỉ cần cài đặt các method của CoordinationBackend.
+"""
+import fcntl
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+RESULT_CYCLES_KEPT = 20  # chỉ giữ kết quả của N chu kỳ gần nhất
+
+
+class CoordinationBackend:
+    def heartbeat(self, node_id, ttl):
+        """Báo node còn sống trong `ttl` giây"""
+        raise NotImplementedError
+
+    def live_nodes(self):
+        """Danh sách node còn hạn heartbeat (đã sort)"""
+        raise NotImplementedError
+
+    def acquire_lease(self, name, node_id, ttl):
+        """Lấy hoặc gia hạn lease; True nếu node đang giữ lease sau lời gọi"""
+        raise NotImplementedError
+
+    def release_lease(self, name, node_id):
+        raise NotImplementedError
+
+    def prune_expired(self):
+        """Xóa lease và heartbeat đã hết hạn (vd: lease report-<cycle> của các chu kỳ cũ)"""
+        raise NotImplementedError
+
+    def publish_result(self, cycle, symbol, message, node_id):
+        raise NotImplementedError
+
+    def collect_results(self, cycle):
+        """Kết quả của tất cả node trong một chu kỳ -> {symbol: message}"""
+        raise NotImplementedError
+
+
+class SQLiteBackend(CoordinationBackend):
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(self.path, timeout=30) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, expires_at REAL);
+                CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL);
+                CREATE TABLE IF NOT EXISTS results (
+                    cycle TEXT, symbol TEXT, message TEXT, node_id TEXT, created_at REAL,
+                    PRIMARY KEY (cycle, symbol)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Mỗi lời gọi một connection: an toàn khi nhiều thread dùng chung backend
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, node_id, ttl):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO nodes VALUES (?, ?) ON CONFLICT(node_id) DO UPDATE SET expires_at = excluded.expires_at",
+                (node_id, time.time() + ttl),
+            )
+
+    def live_nodes(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT node_id FROM nodes WHERE expires_at > ? ORDER BY node_id", (time.time(),))
+            return [r[0] for r in rows]
+
+    def acquire_lease(self, name, node_id, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE
+                   SET owner = excluded.owner, expires_at = excluded.expires_at
+                   WHERE leases.owner = excluded.owner OR leases.expires_at <= ?""",
+                (name, node_id, now + ttl, now),
+            )
+            owner = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()[0]
+        return owner == node_id
+
+    def release_lease(self, name, node_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, node_id))
+
+    def prune_expired(self):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM nodes WHERE expires_at <= ?", (now,))
+
+    def publish_result(self, cycle, symbol, message, node_id):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (cycle, symbol, message, node_id, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM results WHERE cycle NOT IN (SELECT DISTINCT cycle FROM results ORDER BY cycle DESC LIMIT ?)",
+                (RESULT_CYCLES_KEPT,),
+            )
+
+    def collect_results(self, cycle):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT symbol, message FROM results WHERE cycle = ?", (cycle,))
+            return dict(rows.fetchall())
+
+
+class FileLockBackend(CoordinationBackend):
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.state_file = os.path.join(directory, "cluster_state.json")
+        self.lock_file = os.path.join(directory, "cluster_state.lock")
+
+    @contextmanager
+    def _state(self):
+        """Đọc - sửa - ghi state dưới khóa độc quyền"""
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = {"nodes": {}, "leases": {}, "results": {}}
+                if os.path.exists(self.state_file):
+                    with open(self.state_file) as f:
+                        state = json.load(f)
+                yield state
+                tmp_file = self.state_file + ".tmp"
+                with open(tmp_file, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_file, self.state_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def heartbeat(self, node_id, ttl):
+        with self._state() as state:
+            state["nodes"][node_id] = time.time() + ttl
+
+    def live_nodes(self):
+        now = time.time()
+        with self._state() as state:
+            return sorted(n for n, expires_at in state["nodes"].items() if expires_at > now)
+
+    def acquire_lease(self, name, node_id, ttl):
+        now = time.time()
+        with self._state() as state:
+            lease = state["leases"].get(name)
+            if lease is None or lease["owner"] == node_id or lease["expires_at"] <= now:
+                state["leases"][name] = {"owner": node_id, "expires_at": now + ttl}
+                return True
+            return False
+
+    def release_lease(self, name, node_id):
+        with self._state() as state:
+            if state["leases"].get(name, {}).get("owner") == node_id:
+                del state["leases"][name]
+
+    def prune_expired(self):
+        now = time.time()
+        with self._state() as state:
+            state["leases"] = {n: lease for n, lease in state["leases"].items() if lease["expires_at"] > now}
+            state["nodes"] = {n: expires_at for n, expires_at in state["nodes"].items() if expires_at > now}
+
+    def publish_result(self, cycle, symbol, message, node_id):
+        with self._state() as state:
+            state["results"].setdefault(cycle, {})[symbol] = message
+            for old_cycle in sorted(state["results"])[:-RESULT_CYCLES_KEPT]:
+                del state["results"][old_cycle]
+
+    def collect_results(self, cycle):
+        with self._state() as state:
+            return dict(state["results"].get(cycle, {}))
+
+
+def create_backend(url):
+    """sqlite://<đường dẫn file .db> hoặc file://<thư mục>, vd: sqlite:///var/lib/binance_cron/cluster.db"""
+    scheme, _, path = url.partition("://")
+    if scheme == "sqlite" and path:
+        return SQLiteBackend(path)
+    if scheme == "file" and path:
+        return FileLockBackend(path)
+    raise ValueError(f"Backend điều phối không hỗ trợ: {url}")
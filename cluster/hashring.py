@@ -0,0 +1,48 @@
+import bisect
+import hashlib
+
+
+def stable_hash(key):
+    """Hash ổn định giữa các tiến trình/máy (khác với hash() của Python)"""
+    return int(hashlib.md5(str(key).encode("utf-8")).hexdigest(), 16)
+
+
+def shard_of(symbol, shard_count):
+    """Shard cố định của một symbol, không phụ thuộc số node đang sống"""
+    return stable_hash(symbol) % shard_count
+
+
+class HashRing:
+    """Consistent hashing: mỗi node có `vnodes` điểm trên vòng, khi thêm/bớt node chỉ ~1/N key bị chuyển"""
+
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self._points = []   # hash đã sort
+        self._owners = {}   # hash -> node
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            point = stable_hash(f"{node}#{i}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+                self._owners[point] = node
+
+    def remove(self, node):
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+
+    def owner(self, key):
+        """Node sở hữu key, None nếu vòng rỗng"""
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, stable_hash(key)) % len(self._points)
+        return self._owners[self._points[i]]
+
+    def assign(self, keys):
+        """Chia keys theo node -> {node: [keys]}"""
+        assignment = {}
+        for key in keys:
+            assignment.setdefault(self.owner(key), []).append(key)
+        return assignment
@@ -0,0 +1,122 @@
+import threading
+
+from cluster.hashring import HashRing, shard_of
+
+
+class ClusterNode:
+    """
+    Một worker trong cụm: giữ heartbeat, nhận lease cho các shard mà hash ring giao cho mình,
+    trả lại shard khi ring thay đổi. Node chết -> heartbeat/lease hết hạn -> node khác nhận shard.
+    on_change(owned_shards): gọi sau mỗi lần tập shard thay đổi (vd: thêm/bớt worker theo symbol).
+    """
+
+    def __init__(self, backend, node_id, shard_count=16, lease_ttl=60, on_change=None):
+        self.backend = backend
+        self.node_id = node_id
+        self.shard_count = shard_count
+        self.lease_ttl = lease_ttl
+        self.on_change = on_change
+        self.owned_shards = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def refresh(self):
+        """Heartbeat, tính lại ring theo node đang sống, lấy/gia hạn/trả lease shard"""
+        self.backend.heartbeat(self.node_id, self.lease_ttl)
+        ring = HashRing(self.backend.live_nodes())
+
+        owned = set()
+        for shard in range(self.shard_count):
+            name = f"shard-{shard}"
+            if ring.owner(name) == self.node_id:
+                # Lease có thể còn do node cũ giữ tới khi nó trả/hết hạn -> thử lại lần refresh sau
+                if self.backend.acquire_lease(name, self.node_id, self.lease_ttl):
+                    owned.add(shard)
+            elif shard in self.owned_shards:
+                self.backend.release_lease(name, self.node_id)
+
+        with self._lock:
+            changed = owned != self.owned_shards
+            if changed:
+                print(f" Node {self.node_id} giữ {len(owned)}/{self.shard_count} shard")
+            self.owned_shards = owned
+
+        # Lease hết hạn (report-<cycle>, shard của node đã chết) không còn tác dụng -> dọn khỏi backend
+        self.backend.prune_expired()
+        if changed and self.on_change:
+            self.on_change(owned)
+        return owned
+
+    def owns(self, symbol):
+        with self._lock:
+            return shard_of(symbol, self.shard_count) in self.owned_shards
+
+    def owned_symbols(self, symbols):
+        return [s for s in symbols if self.owns(s)]
+
+    def start(self):
+        """Chạy refresh định kỳ (1/3 TTL) trong thread nền"""
+        self.refresh()
+
+        def loop():
+            while not self._stop.wait(self.lease_ttl / 3):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f" Lỗi refresh cluster node {self.node_id}: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        """Dừng và trả toàn bộ lease để node khác nhận ngay"""
+        self._stop.set()
+        with self._lock:
+            shards, self.owned_shards = self.owned_shards, set()
+        if shards and self.on_change:
+            self.on_change(set())
+        for shard in shards:
+            self.backend.release_lease(f"shard-{shard}", self.node_id)
+
+    def publish(self, cycle, symbol, message):
+        self.backend.publish_result(cycle, symbol, message, self.node_id)
+
+    def collect(self, cycle):
+        """Kết quả của mọi node trong chu kỳ -> {symbol: message}"""
+        return self.backend.collect_results(cycle)
+
+    def claim_report(self, cycle):
+        """Chỉ node đầu tiên gọi cho mỗi chu kỳ nhận True -> báo cáo chỉ được gửi 1 lần"""
+        return self.backend.acquire_lease(f"report-{cycle}", self.node_id, 24 * 60 * 60)
+
+
+class WorkerPool:
+    """
+    Một thread worker cho mỗi symbol node đang xử lý. sync() chạy worker cho symbol mới và dừng
+    worker của symbol đã chuyển sang node khác (gọi từ ClusterNode.on_change hoặc 1 lần khi chạy 1 node).
+    target(symbol, stop, delay): vòng lặp của worker, thoát khi `stop` (Event) được set.
+    """
+
+    def __init__(self, target, stagger=1.0):
+        self.target = target
+        self.stagger = stagger  # giãn thời điểm chạy đầu tiên giữa các worker mới, không chặn thread gọi
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def sync(self, symbols):
+        with self._lock:
+            for symbol in [s for s in self._workers if s not in symbols]:
+                self._workers.pop(symbol).set()
+            started = 0
+            for symbol in symbols:
+                if symbol in self._workers:
+                    continue
+                stop = self._workers[symbol] = threading.Event()
+                threading.Thread(target=self.target, args=(symbol, stop, started * self.stagger), daemon=True).start()
+                started += 1
+
+    def symbols(self):
+        with self._lock:
+            return list(self._workers)
+
+    def stop(self):
+        self.sync([])
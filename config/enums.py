@@ -1,9 +1,29 @@
 from enum import Enum
+import os
+import socket
 
 SLEEP_INTERVAL = 24 * 60 * 60  # 24 hours in seconds
 
 SLEEP_INTERVAL_TRADING = 4 * 60 * 60  # 24 hours in seconds
 
+# Intraday cổ phiếu VN: poll bar 1 phút trong phiên (giờ Việt Nam)
+INTRADAY_POLL_INTERVAL = 5 * 60  # seconds
+VN_TIMEZONE = "Asia/Ho_Chi_Minh"
+
+INTERVAL_SECONDS = {"1h": 60 * 60, "4h": 4 * 60 * 60, "1d": 24 * 60 * 60}
+
+# Cache klines dùng chung trong tiến trình (cửa sổ nến đã đóng được giữ tới khi LRU đầy)
+KLINE_CACHE_SIZE = 512
+KLINE_CACHE_TTL = 60  # seconds
+# Cửa sổ nến đã đóng (có to_timestamp, vd: DailyBlockchain.py / backtest) còn được lưu ra SQLite, dùng chung
+# giữa các tiến trình và lần chạy; cửa sổ cùng mốc cuối dùng lại cửa sổ dài hơn đã lưu. Cửa sổ đang chạy
+# (main.py, to_timestamp=None) không được lưu. Rỗng = tắt
+KLINE_STORE_PATH = os.environ.get("KLINE_STORE_PATH", "kline_cache.db")
+
+# Gửi báo cáo tổng hợp khi đủ symbol hoặc sau deadline (tính từ kết quả đầu tiên của chu kỳ)
+REPORT_DEADLINE = 30 * 60  # seconds
+REPORT_DEADLINE_TRADING = 15 * 60  # seconds
+
 SYMBOL_CK = [
     "TCB", "VPB", "MBB", "ACB", "SSI", "VND", "VCI", "HCM", "VHM", "MWG", 
     "FPT", "VNM", "MSN", "HPG", "BMP", "TCM", "VHC", "PTB", "GMD", "GAS", 
@@ -17,3 +37,28 @@ SYMBOLS = [
     "AVAX","LINK","ATOM",
     "ICP","AAVE"
 ]
+
+# Cluster: chia symbol cho nhiều node (để trống = chạy 1 node như cũ).
+# CLUSTER_BACKEND cho crypto (main.py), CLUSTER_STOCK_BACKEND cho HOSE/HNX (DailyStock.py): mỗi pipeline
+# một backend riêng để ring / lease / kết quả của 2 nhóm node không lẫn nhau.
+# vd: CLUSTER_BACKEND=sqlite:///var/lib/binance_cron/cluster.db hoặc file:///tmp/binance_cron
+CLUSTER_BACKEND = os.environ.get("CLUSTER_BACKEND", "")
+CLUSTER_STOCK_BACKEND = os.environ.get("CLUSTER_STOCK_BACKEND", "")
+CLUSTER_NODE_ID = os.environ.get("CLUSTER_NODE_ID", f"{socket.gethostname()}-{os.getpid()}")
+CLUSTER_SHARDS = 16
+CLUSTER_LEASE_TTL = 60  # seconds
+
+# Profiling (bật lúc chạy: PROFILE=1, tạo file <PROFILE_DIR>/ENABLE, hoặc kill -USR1 <pid>)
+PROFILE_ENABLED = os.environ.get("PROFILE", "") == "1"
+PROFILE_SYMBOLS = [s for s in os.environ.get("PROFILE_SYMBOLS", "").split(",") if s]  # rỗng = mọi symbol
+PROFILE_EVERY_N_CYCLES = int(os.environ.get("PROFILE_EVERY_N_CYCLES", "1"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_KEEP = 20  # số lần profile gần nhất được giữ lại
+
+# Paper trading: mở lệnh giả lập theo tín hiệu, lưu nhật ký vào SQLite (PAPER_TRADING=1 để bật)
+PAPER_TRADING_ENABLED = os.environ.get("PAPER_TRADING", "") == "1"
+PAPER_TRADING_DB = os.environ.get("PAPER_TRADING_DB", "paper_trades.db")
+PAPER_CAPITAL = float(os.environ.get("PAPER_CAPITAL", "10000"))
+PAPER_RISK_PER_TRADE = 0.01  # 1% vốn mỗi lệnh nếu chạm stop
+PAPER_STOP_PCT = 0.05
+PAPER_TRAIL_PCT = 0.08
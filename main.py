@@ -1,31 +1,92 @@
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import pytz
 from api.crawlData import fetch_klines, SYMBOLS
-from service.calculateData import process_file, get_trend_label
+from service.calculateData import process_buffer, get_trend_label, TREND_LABEL_COLUMNS, TREND_LABEL_WINDOW
+from service.candle_buffer import CandleBufferStore, SourceBuffers
 from notify.notify import tele_notification
-from config.enums import SLEEP_INTERVAL_TRADING
+from service.report_aggregator import CycleAggregator, format_cycle_status, utc_cycle
+from service.profiling import CycleProfiler
+from service.paper_trading import create_trader, trend_signal
+from config.enums import SLEEP_INTERVAL_TRADING, INTERVAL_SECONDS, REPORT_DEADLINE_TRADING, CLUSTER_BACKEND, CLUSTER_NODE_ID, CLUSTER_SHARDS, CLUSTER_LEASE_TTL
+from cluster.coordination import create_backend
+from cluster.node import ClusterNode, WorkerPool
 
 results = {}
 results_lock = threading.Lock()
-completed_count = 0  # ĐÃ SỬA: Phải khai báo ở ngoài function
 
-def job(symbol, interval_name, interval_str, limit):
-    global completed_count 
+# Buffer nến cố định theo (symbol, interval), mỗi nguồn 1 buffer, chỉ fetch phần nến mới mỗi chu kỳ
+candle_buffers = CandleBufferStore(SourceBuffers)
+
+# Nạp lịch sử cho buffer của nguồn mới thắng hedge, chạy ngoài chu kỳ của worker
+backfill_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="backfill")
+backfilling = set()
+backfill_lock = threading.Lock()
+
+# Profiling bật/tắt lúc chạy (xem service/profiling.py)
+profiler = CycleProfiler("main")
+
+# Paper trading theo tín hiệu trend (PAPER_TRADING=1), None = tắt
+paper_trader = create_trader()
+
+# ClusterNode khi chạy nhiều node (CLUSTER_BACKEND), None = 1 node xử lý toàn bộ SYMBOLS
+cluster_node = None
+
+def backfill(symbol, interval_str, buffers, source):
+    """Nạp lại cả cửa sổ cho buffer của `source` ở thread nền, chu kỳ hiện tại không phải chờ"""
+    key = (symbol, interval_str, source)
+    with backfill_lock:
+        if key in backfilling:
+            return
+        backfilling.add(key)
+
+    def run():
+        try:
+            klines = fetch_klines(symbol, interval_str, buffers.capacity, source=source)
+            # Chỉ ghi buffer của `source` (chưa được worker dùng); nguồn khác thắng thì bỏ, lần sau nạp lại
+            if klines and klines[-1].get('source') == source:
+                buffers.get(source).replace(klines)
+        except Exception as e:
+            print(f" Lỗi nạp lịch sử {symbol} ({source}): {e}")
+        finally:
+            with backfill_lock:
+                backfilling.discard(key)
+
+    backfill_pool.submit(run)
+
+def job(symbol, interval_name, interval_str, limit, stop, delay=0):
+    buffers = candle_buffers.get(f"{symbol}USDT", interval_str, limit + 1)
+    step = INTERVAL_SECONDS[interval_str]
+    if stop.wait(delay):
+        return
     
-    while True:
+    while not stop.is_set():
         try:
-            print(f"\n Đang xử lý {symbol}...")
+            with profiler.profile("cycle", symbol):
+                print(f"\n Đang xử lý {symbol}...")
                 
-            # Fetch and process data
-            # endtime = datetime(2025, 12, 20, 15, 0)  
-            # toTs = int(endtime.timestamp())
-            # klines = fetch_klines(symbol, interval_str, limit,toTs)
-            klines = fetch_klines(symbol, interval_str, limit)
+                # Fetch and process data
+                # endtime = datetime(2025, 12, 20, 15, 0)  
+                # toTs = int(endtime.timestamp())
+                # klines = fetch_klines(symbol, interval_str, limit,toTs)
+                klines = fetch_klines(symbol, interval_str, buffers.missing_bars(step), source=buffers.active)
+                if not klines:
+                    raise ValueError(f"Không có dữ liệu klines cho {symbol}")
+                # Mỗi nguồn 1 buffer (volume không cùng thang đo): delta vào buffer của nguồn thắng
+                buffer = buffers.add(klines, step)
+                if buffer is None:
+                    # Nguồn thắng chưa có lịch sử nối tiếp: nạp nền, chu kỳ này dùng buffer đang có
+                    # (nến đóng chưa tới -> báo cáo ghi là dữ liệu cũ thay vì chờ fetch cả cửa sổ)
+                    print(f" {symbol}: nguồn {klines[-1].get('source')} chưa có lịch sử, nạp nền")
+                    backfill(symbol, interval_str, buffers, klines[-1].get('source'))
+                    buffer = buffers.active_buffer()
+                    if buffer is None or not buffer.size:
+                        raise ValueError(f"Chưa có lịch sử nến cho {symbol}")
             
-            processed_data = process_file(klines, (20, 50, 90),20)
-            message = get_trend_label(processed_data)
+                processed_data = process_buffer(buffer, (20, 50, 90), 20, TREND_LABEL_COLUMNS, TREND_LABEL_WINDOW)
+                message = get_trend_label(processed_data)
             
             with results_lock:
                 results[symbol] = {
@@ -33,29 +94,45 @@ def job(symbol, interval_name, interval_str, limit):
                     "timestamp": datetime.now(),
                     "interval": interval_name
                 }
-                completed_count += 1
-                
-                if completed_count == len(SYMBOLS):
-                    send_aggregated_report_once()
-                    completed_count = 0  
+
+            # Chu kỳ = thời gian (UTC) nến đã đóng gần nhất, kết quả các chu kỳ khác nhau không bị trộn
+            cycle = utc_cycle(buffer.view("timestamp")[-2])
+            if paper_trader:
+                closed = processed_data[-2]
+                paper_trader.on_bar(symbol, closed)
+                side = trend_signal(closed)
+                if side:
+                    paper_trader.on_signal(symbol, side, float(closed["close"]), closed["timestamp"], "main", f"trend_score {closed['trend_score']}")
+            if cluster_node:
+                cluster_node.publish(cycle, symbol, message)
+                aggregator.submit_many(cycle, cluster_node.collect(cycle))
+            else:
+                aggregator.submit(cycle, symbol, message)
                 
         except Exception as e:
             print(f" Lỗi xử lý {symbol}: {e}")
             import traceback
             traceback.print_exc()
+            aggregator.fail(symbol, e)
         
-        time.sleep(SLEEP_INTERVAL_TRADING)
+        stop.wait(SLEEP_INTERVAL_TRADING)
 
-def send_aggregated_report_once():
-    print("\n Gửi báo cáo tổng hợp...")
+# Node chỉ chạy worker cho symbol mình giữ, thêm/bớt khi rebalance
+workers = WorkerPool(lambda symbol, stop, delay: job(symbol, "4h", "4h", 200, stop, delay))
+
+def send_aggregated_report_once(cycle, messages, missing, stale, errors):
+    """Gọi bởi CycleAggregator, đúng 1 lần mỗi chu kỳ (đủ symbol hoặc hết deadline)"""
+    if cluster_node and not cluster_node.claim_report(cycle):
+        return  # node khác trong cluster đã gửi báo cáo chu kỳ này
+
+    print(f"\n Gửi báo cáo tổng hợp chu kỳ {cycle}...")
     aggregated_message = f"<b>📊BÁO CÁO TỔNG HỢP NGÀY {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</b>\n"
     aggregated_message += "="*40 + "\n"
     
     for symbol in SYMBOLS:
-        if symbol in results:
-            r = results[symbol]
-            if r['message']:
-                aggregated_message += f"{r['message']}"
+        if messages.get(symbol):
+            aggregated_message += f"{messages[symbol]}"
+    aggregated_message += format_cycle_status(missing, stale, errors)
     
     if aggregated_message.count('\n') > 2:
         tele_notification(aggregated_message)
@@ -63,24 +140,30 @@ def send_aggregated_report_once():
     else:
         print("\n Không có dữ liệu để gửi trong báo cáo tổng hợp")
 
+aggregator = CycleAggregator(SYMBOLS, REPORT_DEADLINE_TRADING, send_aggregated_report_once)
+
 if __name__ == "__main__":
     print("Bắt đầu hệ thống theo dõi crypto...")
+    profiler.install_signal_handler()
     
     try:
-        threads = []
-        for symbol in SYMBOLS:
-            t = threading.Thread(
-                target=job,
-                args=(symbol, "4h", "4h", 200),
-                daemon=False  
+        if CLUSTER_BACKEND:
+            cluster_node = ClusterNode(
+                create_backend(CLUSTER_BACKEND), CLUSTER_NODE_ID, CLUSTER_SHARDS, CLUSTER_LEASE_TTL,
+                on_change=lambda shards: workers.sync(cluster_node.owned_symbols(SYMBOLS)),
             )
-            t.start()
-            threads.append(t)
-            time.sleep(1)
+            aggregator.collect = cluster_node.collect
+            print(f"Chạy cluster mode, node {CLUSTER_NODE_ID}")
+            cluster_node.start()
+        else:
+            workers.sync(SYMBOLS)
 
-        # Chỉ cần join một lần, threads sẽ chạy mãi mãi
-        for t in threads:
-            t.join()
+        # Worker chạy trong thread nền (được thêm/bớt khi rebalance), main thread chỉ chờ Ctrl+C
+        while True:
+            time.sleep(60)
             
     except KeyboardInterrupt:
-        print("\nĐang dừng hệ thống...")
\ No newline at end of file
+        print("\nĐang dừng hệ thống...")
+        if cluster_node:
+            cluster_node.stop()
+        workers.stop()
\ No newline at end of file
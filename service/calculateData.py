@@ -1,5 +1,19 @@
 RSI_PERIOD = 14
 
+# Đồ thị phụ thuộc giữa các cột indicator: cột -> các cột phải được tính trước
+INDICATOR_DEPS = {
+    "trend_score": ("ema_20", "ema_50", "ema_90", "rsi14", "macd", "macd_signal"),
+    "macd_histogram": ("macd", "macd_signal"),
+    "macd_signal": ("macd",),
+}
+
+# Cột tính trên từng dòng (không phải series từ giá đóng cửa)
+ROW_COLUMNS = ("trend_score", "volume_ratio")
+
+# Các cột và số nến cuối mà get_trend_label thực sự đọc (data[-7:-1])
+TREND_LABEL_COLUMNS = ("trend_score", "rsi14", "volume_ratio")
+TREND_LABEL_WINDOW = 7
+
 def get_trend_label(data):
     # Kiểm tra nến cuối có trend_score không
     last_candle = data[-2]
@@ -126,10 +140,27 @@ def calculate_rsi(prices, period=RSI_PERIOD):
     
     return rsi
 
-def calculate_macd(prices):
-    """Tính toán MACD (Moving Average Convergence Divergence)"""
-    ema12 = calculate_ema(prices, 12)
-    ema26 = calculate_ema(prices, 26)
+def calculate_rsi_state(prices, period=RSI_PERIOD):
+    """Trạng thái Wilder (avg_gain, avg_loss) sau giá cuối, để cập nhật RSI từng bước; None nếu thiếu dữ liệu"""
+    if len(prices) <= period:
+        return None
+
+    changes = [b - a for a, b in zip(prices, prices[1:])]
+    avg_gain = sum(max(c, 0) for c in changes[:period]) / period
+    avg_loss = sum(-min(c, 0) for c in changes[:period]) / period
+    for c in changes[period:]:
+        avg_gain = (avg_gain * (period - 1) + max(c, 0)) / period
+        avg_loss = (avg_loss * (period - 1) - min(c, 0)) / period
+    return avg_gain, avg_loss
+
+def calculate_macd(prices, cache=None):
+    """Tính toán MACD (Moving Average Convergence Divergence)
+
+    cache: dict series dùng chung, để EMA12/EMA26 không bị tính lại nếu đã có
+    """
+    cache = {} if cache is None else cache
+    ema12 = _indicator_series("ema_12", prices, cache)
+    ema26 = _indicator_series("ema_26", prices, cache)
     
     if not ema12 or not ema26:
         return [], [], []
@@ -139,79 +170,130 @@ def calculate_macd(prices):
     hist = [a - b for a, b in zip(macd[-len(signal):], signal)] if signal else []
     return macd, signal, hist
 
-def process_file(data,periods=(20, 50, 90), ma_volume_period=20):
-    """Tính EMA, RSI, MACD trên dữ liệu trong memory, không ghi CSV"""
+def resolve_columns(columns):
+    """Mở rộng danh sách cột theo INDICATOR_DEPS, bỏ trùng, cột phụ thuộc đứng trước"""
+    resolved = []
+
+    def visit(column):
+        if column in resolved:
+            return
+        for dep in INDICATOR_DEPS.get(column, ()):
+            visit(dep)
+        resolved.append(column)
+
+    for column in columns:
+        visit(column)
+    return resolved
+
+def _indicator_series(column, closes, cache):
+    """Trả về series của một cột indicator, dùng chung qua cache (vd: EMA12/EMA26 của MACD)"""
+    if column in cache:
+        return cache[column]
+
+    if column.startswith("ema_"):
+        cache[column] = calculate_ema(closes, int(column[len("ema_"):]))
+    elif column == f"rsi{RSI_PERIOD}":
+        cache[column] = calculate_rsi(closes)
+    elif column in ("macd", "macd_signal", "macd_histogram"):
+        cache["macd"], cache["macd_signal"], cache["macd_histogram"] = calculate_macd(closes, cache)
+    else:
+        raise ValueError(f"Indicator không hỗ trợ: {column}")
+    return cache[column]
+
+def default_columns(periods=(20, 50, 90)):
+    """Toàn bộ cột mà process_file tính khi consumer không khai báo"""
+    return [f"ema_{p}" for p in periods] + [
+        f"rsi{RSI_PERIOD}", "macd", "macd_signal", "macd_histogram", "trend_score", "volume_ratio"
+    ]
+
+def process_file(data, periods=(20, 50, 90), ma_volume_period=20, columns=None, tail=None):
+    """Tính EMA, RSI, MACD trên dữ liệu trong memory, không ghi CSV
+
+    columns: các cột consumer đọc (mặc định: tất cả), cột phụ thuộc được thêm tự động.
+    tail: chỉ ghi indicator cho `tail` nến cuối và trả về đúng phần đó (None = toàn bộ).
+    """
     if not data or "close" not in data[0]:
         print("Dữ liệu không hợp lệ hoặc thiếu cột 'close'")
         return data  # Return data ngay cả khi không xử lý được
 
     closes = [float(r["close"]) for r in data]
-    ema = {p: calculate_ema(closes, p) for p in periods}
-    rsi = calculate_rsi(closes)
-    macd, sig, hist = calculate_macd(closes)
-
-    n = len(data)
-    for i, row in enumerate(data):
-        # EMA
-        for p in periods:
-            e = ema[p]
-            row[f"ema_{p}"] = f"{e[i - (n - len(e))]:.2f}" if i >= n - len(e) else ""
-        # RSI
-        if i >= n - len(rsi):
-            row["rsi14"] = f"{rsi[i - (n - len(rsi))]:.2f}"
-        else:
-            row["rsi14"] = ""
-        # MACD
-        if i >= n - len(macd):
-            mi = i - (n - len(macd))
-            row["macd"] = f"{macd[mi]:.2f}"
-            if mi >= len(macd) - len(sig):
-                si = mi - (len(macd) - len(sig))
-                row["macd_signal"] = f"{sig[si]:.2f}"
-                row["macd_histogram"] = f"{hist[si]:.2f}" if si < len(hist) else ""
-            else:
-                row["macd_signal"] = row["macd_histogram"] = ""
-        else:
-            row["macd"] = row["macd_signal"] = row["macd_histogram"] = ""
-        if row["ema_20"] and row["ema_50"] and row["ema_90"] and row["rsi14"] and row["macd"] and row["macd_signal"]:
-            row["trend_score"] = score_trend(
-                float(row["ema_20"]),
-                float(row["ema_50"]),
-                float(row["ema_90"]),
-                float(row["rsi14"]),
-                float(row["macd"]),
-                float(row["macd_signal"])
-            )
-        else:   
-            row["trend_score"] = ""
-    
-    add_volume_ratio(data,ma_volume_period)
- 
-    return data
+    start = 0 if tail is None else max(len(data) - tail, 0)
+    fill_indicators(data[start:], closes, _volumes(data), periods, ma_volume_period, columns)
+    return data if tail is None else data[start:]
+
+def process_buffer(buffer, periods=(20, 50, 90), ma_volume_period=20, columns=None, tail=None):
+    """Như process_file nhưng đọc close/volume trực tiếp (view, không copy) từ CandleRingBuffer,
+    chỉ tạo dict cho `tail` nến cuối"""
+    rows = buffer.to_rows(tail)
+    if not rows:
+        print("Buffer rỗng, không có dữ liệu để tính")
+        return rows
+
+    fill_indicators(rows, buffer.view("close"), buffer.view("volume"), periods, ma_volume_period, columns)
+    return rows
+
+def fill_indicators(rows, closes, volumes, periods=(20, 50, 90), ma_volume_period=20, columns=None):
+    """Ghi indicator vào `rows`, là các dòng cuối tương ứng với closes/volumes"""
+    needed = resolve_columns(default_columns(periods) if columns is None else columns)
+    cache = {}
+    series = {c: _indicator_series(c, closes, cache) for c in needed if c not in ROW_COLUMNS}
+
+    n = len(closes)
+    start = n - len(rows)
+    for i in range(start, n):
+        row = rows[i - start]
+        # EMA, RSI, MACD: series ngắn hơn data được căn về cuối
+        for column, values in series.items():
+            offset = n - len(values)
+            row[column] = f"{values[i - offset]:.2f}" if i >= offset else ""
+
+        if "trend_score" in needed:
+            if row["ema_20"] and row["ema_50"] and row["ema_90"] and row["rsi14"] and row["macd"] and row["macd_signal"]:
+                row["trend_score"] = score_trend(
+                    float(row["ema_20"]),
+                    float(row["ema_50"]),
+                    float(row["ema_90"]),
+                    float(row["rsi14"]),
+                    float(row["macd"]),
+                    float(row["macd_signal"])
+                )
+            else:   
+                row["trend_score"] = ""
+
+        if "volume_ratio" in needed:
+            row["volume_ratio"] = _volume_ratio(volumes, i, ma_volume_period)
+
+    return rows
 
 # caculate avg vol 
 
-def add_volume_ratio(data, lookback_days=20):
+def add_volume_ratio(data, lookback_days=20, start=0):
     """
     Thêm cột volume_ratio = volume / trung bình volume (dựa trên 50 ngày trước đó)
+    start: chỉ tính từ dòng này trở đi (các dòng trước vẫn được dùng làm lịch sử)
     """
-    for i, d in enumerate(data):
-        if i < lookback_days:
-            # Không đủ dữ liệu để tính trung bình
-            d["volume_ratio"] = ""
-            continue
+    volumes = _volumes(data)
+    for i in range(start, len(data)):
+        data[i]["volume_ratio"] = _volume_ratio(volumes, i, lookback_days)
+
+    return data
 
-        # Lấy 50 ngày trước đó
-        recent_volumes = [float(data[j]["volume"]) for j in range(i - lookback_days, i) if data[j].get("volume")]
-        if not recent_volumes:
-            d["volume_ratio"] = ""
-            continue
+def _volumes(data):
+    return [float(d["volume"]) if d.get("volume") else 0.0 for d in data]
 
-        avg_volume = sum(recent_volumes) / len(recent_volumes)
+def _volume_ratio(volumes, i, lookback_days):
+    """volume_ratio của dòng i so với trung bình `lookback_days` dòng trước đó"""
+    if i < lookback_days:
+        # Không đủ dữ liệu để tính trung bình
+        return ""
+
+    # Lấy 50 ngày trước đó
+    recent_volumes = [v for v in volumes[i - lookback_days:i] if v]
+    if not recent_volumes:
+        return ""
 
-        if d.get("volume") and (float(d['volume']) / avg_volume) > 1:
-            d["volume_ratio"] = f"{(float(d['volume']) / avg_volume):.2f}"
-        else:
-            d["volume_ratio"] = 0
+    avg_volume = sum(recent_volumes) / len(recent_volumes)
 
-    return data
+    if volumes[i] and (volumes[i] / avg_volume) > 1:
+        return f"{(volumes[i] / avg_volume):.2f}"
+    return 0
@@ -0,0 +1,204 @@
+"""
+Ring buffer nến có dung lượng cố định cho các tiến trình chạy dài ngày.
+
+Mỗi (symbol, timeframe) giữ một bộ mảng numpy cấp phát một lần; fetch ghi đè tại chỗ,
+indicator đọc view không copy. Bộ nhớ không tăng theo số chu kỳ chạy.
+"""
+import copy
+import math
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+FIELDS = ("open", "high", "low", "close", "volume")
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class CandleRingBuffer:
+    """
+    Mỗi nến được ghi 2 lần (vị trí i và i + capacity), nên `size` nến cuối luôn là
+    một lát cắt liên tục của mảng -> view() trả về view numpy, không copy.
+    view() chỉ an toàn trong thread ghi buffer; thread khác đọc qua snapshot().
+    """
+
+    def __init__(self, symbol, capacity):
+        self.symbol = symbol
+        self.capacity = capacity
+        self.source = None  # nguồn dữ liệu của các nến trong buffer (volume giữa các nguồn khác nhau)
+        self.size = 0
+        self._head = 0  # vị trí ghi tiếp theo (mod capacity)
+        self._time = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(FIELDS), 2 * capacity), dtype=np.float64)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_timestamp(self):
+        """Epoch (giây) của nến cuối, None nếu buffer rỗng"""
+        if not self.size:
+            return None
+        return int(self._time[(self._head - 1) % self.capacity])
+
+    def append(self, candle):
+        """
+        Thêm 1 nến (dict dạng fetch_klines). Nến trùng thời gian với nến cuối thì ghi đè
+        (nến đang chạy), nến cũ hơn nến cuối thì bỏ qua.
+        """
+        ts = int(datetime.strptime(candle['timestamp'], TIME_FORMAT).timestamp())
+        with self._lock:
+            last = self.last_timestamp
+            if last is not None and ts < last:
+                return
+            if last is not None and ts == last:
+                pos = (self._head - 1) % self.capacity
+            else:
+                pos = self._head
+                self._head = (self._head + 1) % self.capacity
+                self.size = min(self.size + 1, self.capacity)
+
+            self.source = candle.get('source', self.source)
+            for p in (pos, pos + self.capacity):
+                self._time[p] = ts
+                for f, field in enumerate(FIELDS):
+                    self._values[f, p] = float(candle[field])
+
+    def extend(self, candles):
+        """Thêm danh sách nến theo thứ tự thời gian, trả về số nến đã nhận"""
+        with self._lock:
+            for candle in candles:
+                self.append(candle)
+        return len(candles)
+
+    def clear(self):
+        """Bỏ toàn bộ nến (vd: trước khi nạp lại lịch sử từ nguồn khác)"""
+        with self._lock:
+            self.size = 0
+            self._head = 0
+            self.source = None
+
+    def replace(self, candles):
+        """Thay toàn bộ nến bằng `candles` trong 1 lần giữ lock (thread khác không thấy buffer rỗng giữa chừng)"""
+        with self._lock:
+            self.clear()
+            return self.extend(candles)
+
+    def snapshot(self):
+        """Bản copy độc lập, nhất quán của buffer để thread khác đọc trong lúc buffer vẫn được ghi"""
+        with self._lock:
+            clone = copy.copy(self)
+            clone._time = self._time.copy()
+            clone._values = self._values.copy()
+        clone._lock = threading.RLock()
+        return clone
+
+    def _window(self):
+        start = (self._head - self.size) % self.capacity
+        return slice(start, start + self.size)
+
+    def view(self, field):
+        """View (không copy) của 1 cột theo thứ tự thời gian"""
+        if field == "timestamp":
+            return self._time[self._window()]
+        return self._values[FIELDS.index(field), self._window()]
+
+    def to_rows(self, tail=None):
+        """Tạo list dict (định dạng fetch_klines) chỉ cho `tail` nến cuối"""
+        window = self._window()
+        start = window.start if tail is None else max(window.stop - tail, window.start)
+        rows = []
+        for p in range(start, window.stop):
+            row = {'timestamp': datetime.fromtimestamp(int(self._time[p])).strftime(TIME_FORMAT)}
+            for f, field in enumerate(FIELDS):
+                row[field] = float(self._values[f, p])
+            row['symbol'] = self.symbol
+            rows.append(row)
+        return rows
+
+    def missing_bars(self, interval_seconds, now=None):
+        """Số nến cần fetch để bù từ nến cuối tới hiện tại (gồm cả nến cuối để cập nhật)"""
+        if not self.size:
+            return self.capacity
+        now = time.time() if now is None else now
+        missing = math.ceil((now - self.last_timestamp) / interval_seconds) + 1
+        return max(1, min(missing, self.capacity))
+
+
+class SourceBuffers:
+    """
+    Buffer nến của 1 (symbol, timeframe) tách theo nguồn: volume các nguồn không cùng thang đo nên
+    mỗi nguồn ghi vào buffer riêng. Khi nguồn khác thắng hedge, delta vừa fetch được ghi vào buffer
+    của nguồn đó nếu còn nối tiếp được, không phải fetch lại cả cửa sổ trong chu kỳ.
+    """
+
+    # Buffer của nguồn không dùng được giữ nối tiếp tối đa chừng này nến (fetch delta dài thêm tương ứng)
+    MAX_LAG_BARS = 12
+
+    def __init__(self, symbol, capacity):
+        self.symbol = symbol
+        self.capacity = capacity
+        self.active = None  # nguồn của buffer đang dùng để tính indicator
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def get(self, source):
+        with self._lock:
+            if source not in self._buffers:
+                self._buffers[source] = CandleRingBuffer(self.symbol, self.capacity)
+            return self._buffers[source]
+
+    def active_buffer(self):
+        """Buffer đang dùng, None nếu chưa có nguồn nào nạp đủ lịch sử"""
+        with self._lock:
+            return self._buffers.get(self.active)
+
+    def missing_bars(self, interval_seconds, now=None):
+        """
+        Số nến cần fetch để buffer đang dùng và các buffer chậm không quá MAX_LAG_BARS đều
+        nối tiếp được, nguồn nào thắng cũng ghi thẳng delta vào buffer của nó.
+        """
+        active = self.active_buffer()
+        if active is None or not active.size:
+            return self.capacity
+        now = time.time() if now is None else now
+        with self._lock:
+            lasts = [b.last_timestamp for b in self._buffers.values() if b.size]
+        lags = [math.ceil((now - last) / interval_seconds) + 1 for last in lasts]
+        lagging = [lag for lag in lags if lag <= self.MAX_LAG_BARS]
+        return max(active.missing_bars(interval_seconds, now), min(max(lagging, default=1), self.capacity))
+
+    def add(self, candles, interval_seconds):
+        """
+        Ghi nến (cùng 1 nguồn) vào buffer của nguồn đó. Trả về buffer (thành buffer đang dùng) nếu
+        nến nối tiếp được lịch sử, None nếu buffer của nguồn đó chưa có / quá cũ -> cần backfill.
+        """
+        source = candles[-1].get('source')
+        buffer = self.get(source)
+        first = int(datetime.strptime(candles[0]['timestamp'], TIME_FORMAT).timestamp())
+        with buffer._lock:
+            last = buffer.last_timestamp
+            if len(candles) < self.capacity and (last is None or first > last + interval_seconds):
+                return None
+            buffer.extend(candles)
+        with self._lock:
+            self.active = source
+        return buffer
+
+
+class CandleBufferStore:
+    """Quản lý buffer theo (symbol, timeframe), dùng chung giữa các thread"""
+
+    def __init__(self, factory=CandleRingBuffer):
+        self.factory = factory  # CandleRingBuffer hoặc SourceBuffers (1 buffer mỗi nguồn)
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol, timeframe, capacity):
+        key = (symbol, timeframe)
+        with self._lock:
+            if key not in self._buffers:
+                self._buffers[key] = self.factory(symbol, capacity)
+            return self._buffers[key]
@@ -0,0 +1,212 @@
+"""
+Gom bar 1 phút trong phiên của cổ phiếu VN (HOSE/HNX) thành nến 15m / 1h / nến ngày tạm tính,
+và cập nhật indicator từng bước trong phiên.
+
+Lịch phiên (giờ Việt Nam):
+    09:00 - 09:15  ATO (HOSE) -> gộp vào nến đầu phiên sáng
+    09:15 - 11:30  khớp lệnh liên tục
+    11:30 - 13:00  nghỉ trưa, không có nến
+    13:00 - 14:30  khớp lệnh liên tục
+    14:30 - 14:45  ATC -> gộp vào nến cuối phiên chiều
+    sau 14:45      thỏa thuận, bỏ qua
+"""
+from datetime import datetime, time as dtime
+
+from service.calculateData import calculate_ema, calculate_rsi_state, RSI_PERIOD
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# (bắt đầu, kết thúc) từng nửa phiên, gồm cả ATO / ATC
+SESSIONS = (
+    (dtime(9, 0), dtime(11, 30)),
+    (dtime(13, 0), dtime(14, 45)),
+)
+ATO_END = dtime(9, 15)
+# Khung có khớp lệnh để ước tính tiến độ phiên (ATO chỉ là 1 lần khớp)
+TRADING_WINDOWS = ((ATO_END, dtime(11, 30)), (dtime(13, 0), dtime(14, 45)))
+
+BREAKOUT_LOOKBACK = 20       # phá đỉnh/đáy 20 phiên
+VOLUME_PACE_HIGH = 1.5       # volume ước tính cả ngày / trung bình 20 phiên
+MIN_PROGRESS = 0.1           # đầu phiên (ATO) ước tính volume chưa có ý nghĩa
+EMA_PERIODS = (20, 50, 90)
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute + t.second / 60
+
+
+def session_bucket(dt, minutes):
+    """Thời điểm bắt đầu nến `minutes` phút chứa bar `dt`; None nếu bar nằm ngoài phiên"""
+    t = dt.time()
+    for start, end in SESSIONS:
+        if start <= t <= end:
+            if t <= ATO_END and start == SESSIONS[0][0]:
+                t = start  # ATO thuộc nến đầu phiên
+            offset = min(_minutes(t), _minutes(end) - 1e-6) - _minutes(start)  # bar đúng giờ kết thúc -> nến cuối
+            bucket = _minutes(start) + int(offset // minutes) * minutes
+            return datetime.combine(dt.date(), dtime(int(bucket // 60), int(bucket % 60)))
+    return None
+
+
+def session_progress(now):
+    """Tỉ lệ thời gian giao dịch đã qua trong ngày (0..1), dùng để ước tính volume cả ngày"""
+    elapsed = total = 0
+    for start, end in TRADING_WINDOWS:
+        lo, hi = _minutes(start), _minutes(end)
+        elapsed += min(max(_minutes(now.time()) - lo, 0), hi - lo)
+        total += hi - lo
+    return elapsed / total
+
+
+def in_session(now):
+    """Ngày thường, trong khung 09:00 - 14:45"""
+    return now.weekday() < 5 and SESSIONS[0][0] <= now.time() <= SESSIONS[-1][1]
+
+
+def _merge(candle, bar):
+    candle['high'] = max(candle['high'], bar['high'])
+    candle['low'] = min(candle['low'], bar['low'])
+    candle['close'] = bar['close']
+    candle['volume'] += bar['volume']
+
+
+class IntradaySession:
+    """
+    Bar và nến gộp của một mã trong một ngày. add_bars() chỉ xử lý bar mới:
+    nến cuối mỗi khung được cập nhật tại chỗ, không tính lại từ đầu.
+    Bar cuối đã nhận có thể còn đang chạy: bar cùng thời gian đến sau thay bar đó (không gộp 2 lần).
+    """
+
+    def __init__(self, symbol, trading_date, timeframes=(15, 60)):
+        self.symbol = symbol
+        self.trading_date = trading_date  # date
+        self.seen = 0  # số dòng thô SSI đã nhận (gồm dòng lỗi format), do caller cập nhật sau delta fetch
+        self.candles = {m: [] for m in timeframes}
+        self.day = None  # nến ngày tạm tính
+        self.signals = set()  # tín hiệu đã gửi trong phiên
+        self._last_stamp = None  # thời gian bar cuối đã gộp
+        self._before_last = None  # trạng thái nến trước khi gộp bar cuối, để thay bar đó
+
+    def add_bars(self, bars):
+        """Thêm bar (tăng dần theo thời gian, có thể bắt đầu lại từ bar cuối đã nhận), trả về số bar trong phiên được gộp"""
+        used = 0
+        for bar in bars:
+            if self._last_stamp is not None and bar['timestamp'] <= self._last_stamp:
+                if bar['timestamp'] < self._last_stamp:
+                    continue  # đã gộp
+                self._restore()  # bản mới của bar cuối (đang chạy lúc lấy trước đó)
+            self._before_last = self._save()
+            self._last_stamp = bar['timestamp']
+            used += self._merge_bar(bar)
+        return used
+
+    def _merge_bar(self, bar):
+        dt = datetime.strptime(bar['timestamp'], TIME_FORMAT)
+        if dt.date() != self.trading_date:
+            return 0
+        for minutes, candles in self.candles.items():
+            bucket = session_bucket(dt, minutes)
+            if bucket is None:
+                return 0
+            stamp = bucket.strftime(TIME_FORMAT)
+            if candles and candles[-1]['timestamp'] == stamp:
+                _merge(candles[-1], bar)
+            else:
+                candles.append({**bar, 'timestamp': stamp})
+        if self.day is None:
+            midnight = datetime.combine(self.trading_date, dtime()).strftime(TIME_FORMAT)
+            self.day = {**bar, 'timestamp': midnight}
+        else:
+            _merge(self.day, bar)
+        return 1
+
+    def _save(self):
+        """Copy nến cuối mỗi khung và nến ngày (chỉ các nến bar tiếp theo có thể sửa)"""
+        last = {m: (len(c), dict(c[-1]) if c else None) for m, c in self.candles.items()}
+        return last, dict(self.day) if self.day else None
+
+    def _restore(self):
+        last, day = self._before_last
+        for minutes, (count, candle) in last.items():
+            candles = self.candles[minutes]
+            del candles[count:]
+            if candle is not None:
+                candles[-1] = candle
+        self.day = day
+
+
+class IncrementalIndicators:
+    """
+    Trạng thái EMA / RSI đến hết phiên trước, tính 1 lần mỗi ngày từ lịch sử nến ngày.
+    update() tính indicator cho nến ngày tạm tính trong O(1), không duyệt lại lịch sử.
+    """
+
+    def __init__(self, closes, highs, lows, volumes):
+        closes = list(closes)
+        self.prev_close = closes[-1]
+        self.ema = {p: calculate_ema(closes, p)[-1] for p in EMA_PERIODS if len(closes) >= p}
+        self.rsi_state = calculate_rsi_state(closes)
+        self.high_n = max(list(highs)[-BREAKOUT_LOOKBACK:])
+        self.low_n = min(list(lows)[-BREAKOUT_LOOKBACK:])
+        recent = list(volumes)[-BREAKOUT_LOOKBACK:]
+        self.avg_volume = sum(recent) / len(recent) if recent else 0
+
+    def update(self, day, now):
+        """Indicator của nến ngày tạm tính `day` tại thời điểm `now`"""
+        close = day['close']
+        values = {f"ema_{p}": close * (2 / (p + 1)) + prev * (1 - 2 / (p + 1)) for p, prev in self.ema.items()}
+
+        values["rsi14"] = None
+        if self.rsi_state:
+            change = close - self.prev_close
+            avg_gain = (self.rsi_state[0] * (RSI_PERIOD - 1) + max(change, 0)) / RSI_PERIOD
+            avg_loss = (self.rsi_state[1] * (RSI_PERIOD - 1) - min(change, 0)) / RSI_PERIOD
+            values["rsi14"] = 100 - 100 / (1 + avg_gain / avg_loss) if avg_loss else 100
+
+        progress = session_progress(now)
+        projected = day['volume'] / progress if progress >= MIN_PROGRESS else 0
+        values["volume_pace"] = projected / self.avg_volume if self.avg_volume else 0
+        return values
+
+
+def intraday_signal(symbol, session, indicators, now):
+    """Tín hiệu trong phiên (phá đỉnh/đáy 20 phiên kèm volume), mỗi loại chỉ báo 1 lần/phiên"""
+    day = session.day
+    if day is None:
+        return ""
+    values = indicators.update(day, now)
+    rsi = values["rsi14"] or 50
+    ema_50 = values.get("ema_50")
+
+    signal = ""
+    if day['close'] > indicators.high_n and values["volume_pace"] > VOLUME_PACE_HIGH and rsi > 55 \
+            and (ema_50 is None or day['close'] > ema_50):
+        signal = "breakout"
+        message = f"👉<b>{symbol} ⚡ Intraday breakout</b> (đỉnh {BREAKOUT_LOOKBACK} phiên {indicators.high_n:g})"
+    elif day['close'] < indicators.low_n and values["volume_pace"] > VOLUME_PACE_HIGH and rsi < 45:
+        signal = "breakdown"
+        message = f"👉<b>{symbol} 🔻 Intraday breakdown</b> (đáy {BREAKOUT_LOOKBACK} phiên {indicators.low_n:g})"
+
+    if not signal or signal in session.signals:
+        return ""
+    session.signals.add(signal)
+
+    message += f"\nGiá: {day['close']:g} | RSI: {rsi:.1f} | Vol pace: {values['volume_pace']:.2f}x"
+    hourly = session.candles.get(60)
+    if hourly:
+        last = hourly[-1]
+        message += f"\n1h {last['timestamp'][11:16]}: {last['open']:g} → {last['close']:g}, vol {last['volume']:g}"
+    return message + "\n"
+
+
+def trading_day_start(now):
+    """Epoch 00:00 của ngày `now` (để tách lịch sử ngày trước khỏi phiên hôm nay)"""
+    return datetime.combine(now.date(), dtime()).timestamp()
+
+
+def previous_sessions(buffer, now):
+    """Số nến ngày trong buffer thuộc các phiên trước hôm nay"""
+    timestamps = buffer.view("timestamp")
+    cutoff = trading_day_start(now)
+    return int((timestamps < cutoff).sum())
+
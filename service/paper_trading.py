@@ -0,0 +1,345 @@
+"""
+Paper trading: mở / đóng lệnh giả lập theo tín hiệu của các pipeline, theo dõi stop và P&L
+trên từng nến mới, lưu nhật ký lệnh vào SQLite (có index) để so với trade_log.xlsx.
+
+Lệnh đang mở được giữ trong memory theo symbol -> on_bar() chỉ duyệt lệnh mở của symbol đó.
+"""
+import sqlite3
+import threading
+import sys
+from datetime import datetime, timedelta
+
+from config.enums import (
+    PAPER_TRADING_ENABLED, PAPER_TRADING_DB, PAPER_CAPITAL, PAPER_RISK_PER_TRADE, PAPER_STOP_PCT, PAPER_TRAIL_PCT
+)
+
+LONG = "long"
+SHORT = "short"
+STRONG_TREND_SCORE = 5  # cùng ngưỡng "UPTREND/DOWNTREND mạnh" của get_trend_label
+# Ngày trong nhật ký tay: ISO (ô ngày Excel đọc thành chuỗi), dd/mm (quy ước chung), mm/dd (nhập lẫn)
+JOURNAL_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y")
+
+
+class TradeLogStore:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS trades (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT, side TEXT, status TEXT, pipeline TEXT, reason TEXT,
+                    opened_at TEXT, entry_price REAL, size REAL, stop REAL, last_bar TEXT,
+                    closed_at TEXT, exit_price REAL, exit_reason TEXT, pnl REAL, pnl_pct REAL,
+                    mark_price REAL, unrealized_pnl REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_trades_status_symbol ON trades (status, symbol);
+                CREATE INDEX IF NOT EXISTS idx_trades_symbol_opened ON trades (symbol, opened_at);
+                CREATE INDEX IF NOT EXISTS idx_trades_closed ON trades (closed_at);
+                CREATE TABLE IF NOT EXISTS journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT, side TEXT, opened_at TEXT, entry_price REAL, stop REAL,
+                    exit_price REAL, size REAL, pnl REAL, note TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_journal_symbol_opened ON journal (symbol, opened_at);
+            """)
+            # DB tạo trước khi có cột giá mark / P&L chưa chốt
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(trades)")}
+            for column in ("mark_price", "unrealized_pnl"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE trades ADD COLUMN {column} REAL")
+
+    def insert_trade(self, trade):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """INSERT INTO trades (symbol, side, status, pipeline, reason, opened_at, entry_price, size, stop, last_bar,
+                                      mark_price, unrealized_pnl)
+                   VALUES (:symbol, :side, 'open', :pipeline, :reason, :opened_at, :entry_price, :size, :stop, :last_bar,
+                           :mark_price, :unrealized_pnl)""",
+                trade,
+            )
+            return cursor.lastrowid
+
+    def update_trades(self, trades):
+        """Ghi các lệnh đã đổi trong 1 transaction (vd: mọi lệnh mở của symbol sau 1 nến)"""
+        if not trades:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """UPDATE trades SET status = :status, stop = :stop, last_bar = :last_bar, closed_at = :closed_at,
+                   exit_price = :exit_price, exit_reason = :exit_reason, pnl = :pnl, pnl_pct = :pnl_pct,
+                   mark_price = :mark_price, unrealized_pnl = :unrealized_pnl
+                   WHERE id = :id""",
+                trades,
+            )
+
+    def open_trades(self):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute("SELECT * FROM trades WHERE status = 'open'")]
+
+    def trades(self, symbol=None):
+        with self._lock:
+            if symbol:
+                rows = self._conn.execute("SELECT * FROM trades WHERE symbol = ? ORDER BY opened_at", (symbol,))
+            else:
+                rows = self._conn.execute("SELECT * FROM trades ORDER BY opened_at")
+            return [dict(r) for r in rows]
+
+    def replace_journal(self, entries):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM journal")
+            self._conn.executemany(
+                """INSERT INTO journal (symbol, side, opened_at, entry_price, stop, exit_price, size, pnl, note)
+                   VALUES (:symbol, :side, :opened_at, :entry_price, :stop, :exit_price, :size, :pnl, :note)""",
+                entries,
+            )
+
+    def journal(self):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute("SELECT * FROM journal ORDER BY opened_at")]
+
+
+class PaperTrader:
+    """
+    Sizing theo rủi ro cố định: mất `risk_per_trade` vốn nếu chạm stop cách giá vào `stop_pct`.
+    Stop kéo theo (trailing) giá đóng cửa tốt nhất, cách `trail_pct`.
+    """
+
+    def __init__(self, store, capital=PAPER_CAPITAL, risk_per_trade=PAPER_RISK_PER_TRADE,
+                 stop_pct=PAPER_STOP_PCT, trail_pct=PAPER_TRAIL_PCT):
+        self.store = store
+        self.capital = capital
+        self.risk_per_trade = risk_per_trade
+        self.stop_pct = stop_pct
+        self.trail_pct = trail_pct
+        self._open = {}  # symbol -> [trade]
+        self._lock = threading.Lock()
+        for trade in store.open_trades():
+            self._open.setdefault(trade["symbol"], []).append(trade)
+
+    def on_signal(self, symbol, side, price, bar_time, pipeline="", reason=""):
+        """Mở lệnh theo tín hiệu; tín hiệu ngược chiều đóng lệnh đang mở. Trả về lệnh mới hoặc None"""
+        with self._lock:
+            positions = self._open.get(symbol, [])
+            if any(t["side"] == side for t in positions):
+                return None  # đã có lệnh cùng chiều
+            reversed_trades = [t for t in positions if t["side"] != side]
+            for trade in reversed_trades:
+                self._close(trade, price, bar_time, "reverse_signal")
+            self.store.update_trades(reversed_trades)
+
+            stop = price * (1 - self.stop_pct) if side == LONG else price * (1 + self.stop_pct)
+            trade = {
+                "symbol": symbol, "side": side, "status": "open", "pipeline": pipeline, "reason": reason,
+                "opened_at": bar_time, "entry_price": price,
+                "size": self.capital * self.risk_per_trade / (price * self.stop_pct),
+                "stop": stop, "last_bar": bar_time,
+                "closed_at": None, "exit_price": None, "exit_reason": None, "pnl": None, "pnl_pct": None,
+                "mark_price": price, "unrealized_pnl": 0.0,
+            }
+            trade["id"] = self.store.insert_trade(trade)
+            self._open.setdefault(symbol, []).append(trade)
+            print(f" Paper trade: mở {side} {symbol} @ {price:g}, size {trade['size']:.4f}, stop {stop:g}")
+            return trade
+
+    def on_bar(self, symbol, candle):
+        """
+        Cập nhật stop, giá mark / P&L chưa chốt, đóng lệnh chạm stop với một nến đã đóng;
+        O(số lệnh đang mở của symbol), ghi DB 1 transaction cho cả nến
+        """
+        with self._lock:
+            positions = self._open.get(symbol)
+            if not positions:
+                return []
+
+            closed, changed = [], []
+            bar_time = candle["timestamp"]
+            high, low, close = float(candle["high"]), float(candle["low"]), float(candle["close"])
+            for trade in list(positions):
+                if bar_time <= trade["last_bar"]:
+                    continue  # nến đã xử lý (chu kỳ chạy lại trên cùng nến)
+                trade["last_bar"] = bar_time
+                changed.append(trade)
+
+                hit = low <= trade["stop"] if trade["side"] == LONG else high >= trade["stop"]
+                if hit:
+                    self._close(trade, trade["stop"], bar_time, "stop")
+                    closed.append(trade)
+                    continue
+
+                if trade["side"] == LONG:
+                    trade["stop"] = max(trade["stop"], close * (1 - self.trail_pct))
+                else:
+                    trade["stop"] = min(trade["stop"], close * (1 + self.trail_pct))
+                trade["mark_price"] = close
+                trade["unrealized_pnl"] = _pnl(trade, close)
+            self.store.update_trades(changed)
+            return closed
+
+    def _close(self, trade, price, bar_time, reason):
+        """Đóng lệnh trong memory; caller ghi DB (gộp với các lệnh khác cùng nến)"""
+        direction = 1 if trade["side"] == LONG else -1
+        trade.update({
+            "status": "closed", "closed_at": bar_time, "exit_price": price, "exit_reason": reason,
+            "pnl": _pnl(trade, price),
+            "pnl_pct": (price / trade["entry_price"] - 1) * direction * 100,
+            "mark_price": price, "unrealized_pnl": 0.0,
+        })
+        self._open[trade["symbol"]].remove(trade)
+        print(f" Paper trade: đóng {trade['side']} {trade['symbol']} @ {price:g} ({reason}), P&L {trade['pnl']:.2f}")
+
+    def open_positions(self, symbol=None):
+        with self._lock:
+            if symbol:
+                return list(self._open.get(symbol, []))
+            return [t for positions in self._open.values() for t in positions]
+
+
+def _pnl(trade, price):
+    direction = 1 if trade["side"] == LONG else -1
+    return (price - trade["entry_price"]) * trade["size"] * direction
+
+
+def create_trader():
+    """PaperTrader dùng PAPER_TRADING_DB, None nếu paper trading tắt"""
+    if not PAPER_TRADING_ENABLED:
+        return None
+    return PaperTrader(TradeLogStore(PAPER_TRADING_DB))
+
+
+def trend_signal(candle):
+    """Chiều lệnh theo trend_score của nến đã đóng (tín hiệu mạnh của get_trend_label), None nếu không có"""
+    try:
+        score = float(candle.get("trend_score"))
+    except (TypeError, ValueError):
+        return None
+    if score >= STRONG_TREND_SCORE:
+        return LONG
+    if score <= -STRONG_TREND_SCORE:
+        return SHORT
+    return None
+
+
+def _date_candidates(value):
+    """Các cách đọc hợp lệ của 1 ô ngày (ô kiểu ngày của Excel chỉ có 1 cách), theo thứ tự ưu tiên"""
+    if value is None:
+        return []
+    if isinstance(value, datetime):
+        return [datetime(value.year, value.month, value.day)]
+    text = str(value).strip().split(" ")[0]
+    candidates = []
+    for fmt in JOURNAL_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if parsed not in candidates:
+            candidates.append(parsed)
+    return candidates
+
+
+def parse_journal_dates(values):
+    """
+    Đọc cột ngày nhập tay, có thể lẫn dd/mm và mm/dd (vd: '12/5/2025' giữa các dòng tháng 12).
+    Ô chỉ có 1 cách đọc (13/12/2025, ô ngày Excel) làm mốc; ô nhập nhằng lấy cách đọc gần mốc nhất,
+    file không có mốc thì đọc dd/mm. Trả về (dates, notes): None cho ô không đọc được,
+    notes ghi lại từng ô nhập nhằng / bị bỏ.
+    """
+    candidates = [_date_candidates(v) for v in values]
+    anchors = [options[0] for options in candidates if len(options) == 1]
+    dates, notes = [], []
+    for value, options in zip(values, candidates):
+        if not options:
+            dates.append(None)
+            notes.append(f"'{value}': không đọc được ngày, bỏ qua dòng")
+            continue
+        chosen = options[0]
+        if len(options) > 1:
+            if anchors:
+                chosen = min(options, key=lambda d: min(abs(d - a) for a in anchors))
+            readings = " / ".join(d.strftime("%Y-%m-%d") for d in options)
+            notes.append(f"'{value}': nhập nhằng ({readings}), đọc là {chosen:%Y-%m-%d}")
+        dates.append(chosen)
+    return dates, notes
+
+
+def import_journal(path, store=None):
+    """
+    Đọc nhật ký tay trade_log.xlsx (STT, Ngày giao dịch, Loại giao dịch, Cặp, Giá vào, StopLoss,
+    Giá Thoát, kích thước, Lợi Nhuận, Ghi chú) -> list dict chuẩn hóa; lưu vào store nếu có.
+    Ngày nhập nhằng / không đọc được được in ra (xem parse_journal_dates).
+    """
+    import pandas as pd
+
+    df = pd.read_excel(path).dropna(subset=["Cặp", "Giá vào"])
+    value = lambda v: None if pd.isna(v) else float(v)
+    dates, notes = parse_journal_dates([None if pd.isna(v) else v for v in df["Ngày giao dịch"]])
+    for note in notes:
+        print(f" Nhật ký {path}: {note}")
+    entries = []
+    for (_, row), opened in zip(df.iterrows(), dates):
+        if opened is None:
+            continue
+        side = str(row["Loại giao dịch"]).strip().lower()
+        entries.append({
+            "symbol": str(row["Cặp"]).strip().upper().split("/")[0],
+            "side": LONG if side == "mua" else SHORT,
+            "opened_at": opened.strftime("%Y-%m-%d %H:%M:%S"),
+            "entry_price": value(row["Giá vào"]),
+            "stop": value(row["StopLoss"]),
+            "exit_price": value(row["Giá Thoát"]),
+            "size": value(row["kích thước"]),
+            "pnl": value(row["Lợi Nhuận"]),
+            "note": "" if pd.isna(row["Ghi chú"]) else str(row["Ghi chú"]).strip(),
+        })
+    if store is not None:
+        store.replace_journal(entries)
+    return entries
+
+
+def compare_with_journal(store, window_days=3):
+    """
+    Ghép mỗi lệnh trong nhật ký tay với lệnh paper cùng symbol mở gần nhất (trong ±window_days):
+    cùng chiều không, chênh giá vào, P&L % hai bên.
+    """
+    comparison = []
+    for entry in store.journal():
+        opened = datetime.strptime(entry["opened_at"], "%Y-%m-%d %H:%M:%S")
+        candidates = [
+            t for t in store.trades(entry["symbol"])
+            if abs(datetime.strptime(t["opened_at"], "%Y-%m-%d %H:%M:%S") - opened) <= timedelta(days=window_days)
+        ]
+        paper = min(
+            candidates,
+            key=lambda t: abs(datetime.strptime(t["opened_at"], "%Y-%m-%d %H:%M:%S") - opened),
+            default=None,
+        )
+        journal_pnl_pct = None
+        if entry["exit_price"] and entry["entry_price"]:
+            direction = 1 if entry["side"] == LONG else -1
+            journal_pnl_pct = (entry["exit_price"] / entry["entry_price"] - 1) * direction * 100
+        comparison.append({
+            "symbol": entry["symbol"],
+            "journal_opened_at": entry["opened_at"],
+            "journal_side": entry["side"],
+            "journal_pnl_pct": journal_pnl_pct,
+            "paper_opened_at": paper["opened_at"] if paper else None,
+            "paper_side": paper["side"] if paper else None,
+            "same_side": bool(paper) and paper["side"] == entry["side"],
+            "entry_diff_pct": (paper["entry_price"] / entry["entry_price"] - 1) * 100 if paper else None,
+            "paper_pnl_pct": paper["pnl_pct"] if paper else None,
+            "note": entry["note"],
+        })
+    return comparison
+
+
+if __name__ == "__main__":
+    # python -m service.paper_trading [trade_log.xlsx]: so nhật ký tay với lệnh paper
+    store = TradeLogStore(PAPER_TRADING_DB)
+    entries = import_journal(sys.argv[1] if len(sys.argv) > 1 else "trade_log.xlsx", store)
+    print(f"Đã import {len(entries)} lệnh từ nhật ký tay")
+    for row in compare_with_journal(store):
+        paper = f"{row['paper_side']} {row['paper_opened_at']}" if row["paper_side"] else "không có lệnh paper"
+        print(f"{row['symbol']} {row['journal_side']} {row['journal_opened_at']} -> {paper} "
+              f"| P&L% tay {row['journal_pnl_pct']} / paper {row['paper_pnl_pct']}")
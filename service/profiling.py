@@ -0,0 +1,126 @@
+"""
+Chế độ profiling bật/tắt lúc đang chạy, không cần deploy bản khác.
+
+Bật bằng một trong các cách:
+- PROFILE=1 khi khởi động
+- tạo file <PROFILE_DIR>/ENABLE (xóa file để tắt), được kiểm tra mỗi chu kỳ
+- kill -USR1 <pid> để đảo trạng thái
+
+Mỗi chu kỳ được chọn (theo PROFILE_SYMBOLS / PROFILE_EVERY_N_CYCLES) chạy dưới cProfile
+và tracemalloc, ghi ra <PROFILE_DIR>: file .prof (mở bằng pstats/snakeviz) và file .txt
+tóm tắt top hàm theo thời gian + top dòng cấp phát bộ nhớ. Chỉ giữ PROFILE_KEEP lần gần nhất.
+cProfile chỉ thấy thread chạy chu kỳ; tracemalloc tính cấp phát của cả tiến trình trong lúc đó.
+"""
+import cProfile
+import glob
+import io
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from config.enums import PROFILE_ENABLED, PROFILE_SYMBOLS, PROFILE_EVERY_N_CYCLES, PROFILE_DIR, PROFILE_KEEP
+
+TOP_N = 25
+# Bỏ cấp phát của chính tracemalloc / import khỏi snapshot
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class CycleProfiler:
+    def __init__(self, name):
+        self.name = name
+        self.enabled = PROFILE_ENABLED
+        self.flag_file = os.path.join(PROFILE_DIR, "ENABLE")
+        self._skipped = {}  # symbol -> số chu kỳ đã bỏ qua kể từ lần profile gần nhất
+        # cProfile/tracemalloc là tài nguyên chung của tiến trình -> mỗi lúc chỉ profile 1 chu kỳ
+        self._busy = threading.Lock()
+
+    def install_signal_handler(self):
+        """SIGUSR1 đảo trạng thái bật/tắt (chỉ gọi từ main thread)"""
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        print(f" Profiling {self.name}: {'bật' if self.enabled else 'tắt'}")
+
+    def _should_profile(self, symbol):
+        if not (self.enabled or os.path.exists(self.flag_file)):
+            return False
+        if PROFILE_SYMBOLS and symbol not in PROFILE_SYMBOLS:
+            return False
+        # Chu kỳ đến lượt nhưng đang bận profile chu kỳ khác thì chưa tính, chu kỳ sau thử lại
+        skipped = self._skipped.get(symbol)
+        if skipped is not None and skipped + 1 < PROFILE_EVERY_N_CYCLES:
+            self._skipped[symbol] = skipped + 1
+            return False
+        return True
+
+    @contextmanager
+    def profile(self, label, symbol=None):
+        """Bọc một chu kỳ; không làm gì nếu profiling tắt hoặc đang profile chu kỳ khác"""
+        if not self._should_profile(symbol) or not self._busy.acquire(blocking=False):
+            yield
+            return
+
+        self._skipped[symbol] = 0
+        profiler = cProfile.Profile()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._busy.release()
+            try:
+                self._write(label, symbol, profiler, snapshot, elapsed, peak)
+            except Exception as e:
+                print(f" Lỗi ghi profile {self.name}: {e}")
+
+    def _write(self, label, symbol, profiler, snapshot, elapsed, peak):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        base = os.path.join(PROFILE_DIR, f"{self.name}_{label}_{symbol or 'all'}_{stamp}")
+        profiler.dump_stats(base + ".prof")
+
+        out = io.StringIO()
+        out.write(f"{self.name} {label} {symbol or ''} | wall {elapsed:.3f}s | peak alloc {peak / 1024:.1f} KiB\n")
+        # tracemalloc không lọc được theo thread; cProfile chỉ bật trên thread gọi profile()
+        out.write("cProfile: chỉ thread chạy chu kỳ (không gồm thread executor của HedgedFetcher / thread khác)\n")
+        out.write("Bộ nhớ (peak + top dòng): toàn tiến trình, mọi thread trong lúc chu kỳ chạy\n\n")
+        out.write(f"== Top {TOP_N} hàm theo cumulative time ==\n")
+        pstats.Stats(profiler, stream=out).strip_dirs().sort_stats("cumulative").print_stats(TOP_N)
+        out.write(f"\n== Top {TOP_N} dòng cấp phát bộ nhớ ==\n")
+        for stat in snapshot.statistics("lineno")[:TOP_N]:
+            out.write(f"{stat}\n")
+        with open(base + ".txt", "w") as f:
+            f.write(out.getvalue())
+
+        self._rotate()
+        print(f" Đã ghi profile: {base}.txt")
+
+    def _rotate(self):
+        """Chỉ giữ PROFILE_KEEP lần profile gần nhất của tiến trình này"""
+        reports = sorted(glob.glob(os.path.join(PROFILE_DIR, f"{self.name}_*.txt")), key=os.path.getmtime)
+        for report in reports[:-PROFILE_KEEP]:
+            for path in (report, report[:-len(".txt")] + ".prof"):
+                if os.path.exists(path):
+                    os.remove(path)
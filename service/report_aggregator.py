@@ -0,0 +1,123 @@
+import threading
+from datetime import datetime, timezone
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class CycleAggregator:
+    """
+    Gom kết quả theo chu kỳ, key là thời gian đóng nến (vd: '2025-12-20 12:00:00').
+    Báo cáo của một chu kỳ được gửi đúng 1 lần: khi đủ toàn bộ symbols hoặc khi hết
+    `deadline` giây kể từ kết quả đầu tiên, tùy điều kiện nào đến trước.
+
+    send_report(cycle, messages, missing, stale, errors):
+        messages: {symbol: message}, missing: [symbol],
+        stale: {symbol: cycle cũ của kết quả đến muộn}, errors: {symbol: lỗi}
+    collect(cycle): tùy chọn, trả thêm kết quả từ nơi khác (vd: các node trong cluster) lúc gửi
+
+    Kết quả của chu kỳ cũ hơn chu kỳ đang mở / đã gửi (symbol chậm nến: tạm ngừng giao dịch,
+    nguồn chậm cập nhật) được tính là dữ liệu cũ của chu kỳ mới nhất, không mở chu kỳ riêng.
+    """
+
+    def __init__(self, symbols, deadline, send_report, collect=None):
+        self.symbols = list(symbols)
+        self.deadline = deadline
+        self.send_report = send_report
+        self.collect = collect
+        self._cycles = {}
+        self._last_flushed = None
+        self._pending = {"stale": {}, "errors": {}}  # ghi nhận khi chưa có chu kỳ nào mở
+        self._lock = threading.Lock()
+
+    def submit(self, cycle, symbol, message):
+        self.submit_many(cycle, {symbol: message})
+
+    def submit_many(self, cycle, messages):
+        with self._lock:
+            newest = max(self._cycles, default=None)
+            if (self._last_flushed is not None and cycle <= self._last_flushed) or (newest is not None and cycle < newest):
+                # Chu kỳ đã gửi hoặc cũ hơn chu kỳ đang mở: kết quả đến muộn hoặc dữ liệu nguồn bị chậm
+                for symbol in messages:
+                    self._latest_state()["stale"][symbol] = cycle
+                return
+
+            state = self._cycles.get(cycle) or self._open(cycle)
+            state["messages"].update(messages)
+            for symbol in messages:
+                state["errors"].pop(symbol, None)
+            complete = all(s in state["messages"] for s in self.symbols)
+
+        if complete:
+            self.flush(cycle)
+
+    def fail(self, symbol, error):
+        """Symbol lỗi trong chu kỳ hiện tại, được liệt kê trong báo cáo thay vì chặn báo cáo"""
+        with self._lock:
+            self._latest_state()["errors"][symbol] = str(error)
+
+    def flush(self, cycle):
+        """Gửi báo cáo của chu kỳ (gọi bởi timer deadline hoặc khi đủ kết quả)"""
+        with self._lock:
+            state = self._cycles.pop(cycle, None)
+            if state is None:
+                return
+            state["timer"].cancel()
+            if self._last_flushed is not None and cycle <= self._last_flushed:
+                return  # không gửi báo cáo lùi thời gian
+            self._last_flushed = cycle
+
+        messages = state["messages"]
+        if self.collect:
+            try:
+                messages.update(self.collect(cycle))
+            except Exception as e:
+                print(f" Lỗi gom kết quả chu kỳ {cycle}: {e}")
+
+        missing = [s for s in self.symbols if s not in messages]
+        errors = {s: e for s, e in state["errors"].items() if s in missing}
+        stale = {s: c for s, c in state["stale"].items() if s in missing}
+        self.send_report(cycle, messages, missing, stale, errors)
+
+    def _open(self, cycle):
+        stale, errors = self._pending["stale"], self._pending["errors"]
+        self._pending = {"stale": {}, "errors": {}}
+        # Chu kỳ cũ hơn còn mở chỉ gồm symbol chậm nến: gộp vào chu kỳ mới thành dữ liệu cũ, không gửi riêng
+        for old in sorted(c for c in self._cycles if c < cycle):
+            old_state = self._cycles.pop(old)
+            old_state["timer"].cancel()
+            stale.update(old_state["stale"])
+            errors.update(old_state["errors"])
+            stale.update({symbol: old for symbol in old_state["messages"]})
+
+        timer = threading.Timer(self.deadline, self.flush, args=(cycle,))
+        timer.daemon = True
+        state = {"messages": {}, "stale": stale, "errors": errors, "timer": timer}
+        self._cycles[cycle] = state
+        timer.start()
+        return state
+
+    def _latest_state(self):
+        if self._cycles:
+            return self._cycles[max(self._cycles)]
+        return self._pending
+
+
+def utc_cycle(epoch):
+    """
+    Key chu kỳ từ epoch của nến đã đóng: chuỗi giờ UTC, giống nhau trên mọi node bất kể múi giờ máy
+    (timestamp dạng chuỗi của nến crypto là giờ local của máy chạy).
+    """
+    return datetime.fromtimestamp(int(epoch), timezone.utc).strftime(TIME_FORMAT)
+
+
+def format_cycle_status(missing, stale, errors):
+    """Dòng cuối báo cáo: các symbol thiếu / dữ liệu cũ / lỗi trong chu kỳ"""
+    lines = ""
+    late = [s for s in missing if s not in stale and s not in errors]
+    if late:
+        lines += f"⏳ Chưa có kết quả: {', '.join(late)}\n"
+    if stale:
+        lines += "⌛ Dữ liệu cũ: " + ", ".join(f"{s} ({c})" for s, c in stale.items()) + "\n"
+    if errors:
+        lines += f"❌ Lỗi: {', '.join(errors)}\n"
+    return lines
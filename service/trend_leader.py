@@ -0,0 +1,229 @@
+"""
+Phát hiện trend leader / down-trend leader theo playbook trong file `knowleadge`.
+
+Toàn bộ universe (vd: SYMBOL_CK) được xếp thành ma trận (mã x phiên, mỗi nhóm mã cùng độ dài lịch sử)
+và đánh giá trong một lần duyệt mảng, không lặp theo từng mã.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from service.candle_buffer import CandleRingBuffer
+
+# ---- Trend leader ----
+VOL_LOOKBACK = 20           # số phiên tính volume trung bình
+VOL_RATIO_HIGH = 1.2        # volume / trung bình >= ngưỡng này là phiên vol cao
+VOL_WINDOW = 10             # xét vol cao trong 10 phiên gần nhất
+VOL_MIN_SESSIONS = 5        # cần >= 5 phiên vol cao
+MOVE_MIN = 0.10             # giá chênh 10% - 20% so với lúc bắt đầu vol
+MOVE_MAX = 0.20
+SLOPE_LOOKBACK = 5          # độ dốc EMA đo trên 5 phiên
+EMA50_SLOPE_MIN = 0.005     # EMA50 cong lên
+EMA90_FLAT_MAX = 0.01       # EMA90 phẳng
+SWING_WIDTH = 3             # đỉnh/đáy: cao/thấp nhất trong +-3 phiên
+RSI_LOOKBACK = 20           # RSI từng < 40 trong 20 phiên gần nhất
+RSI_HOLD_SESSIONS = 3       # ... và giữ trên 50 ít nhất 3 phiên cuối
+
+# ---- Down trend leader ----
+DOWN_RSI_LOW = 30           # RSI loanh quanh 3x - 4x
+DOWN_RSI_HIGH = 50
+DOWN_RSI_SESSIONS = 5
+
+MIN_BARS = 90 + RSI_LOOKBACK
+
+
+def ema_matrix(values, period):
+    """EMA theo từng hàng, khởi tạo bằng SMA như calculate_ema; NaN khi chưa đủ dữ liệu"""
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] < period:
+        return out
+    k = 2 / (period + 1)
+    out[:, period - 1] = values[:, :period].mean(axis=1)
+    for t in range(period, values.shape[1]):
+        out[:, t] = values[:, t] * k + out[:, t - 1] * (1 - k)
+    return out
+
+
+def rsi_matrix(closes, period=14):
+    """RSI Wilder theo từng hàng, cùng công thức với calculate_rsi"""
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[1] <= period:
+        return out
+    changes = np.diff(closes, axis=1)
+    gains = np.clip(changes, 0, None)
+    losses = np.clip(-changes, 0, None)
+    avg_gain = gains[:, :period].mean(axis=1)
+    avg_loss = losses[:, :period].mean(axis=1)
+    for t in range(period, changes.shape[1]):
+        avg_gain = (avg_gain * (period - 1) + gains[:, t]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[:, t]) / period
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+        out[:, t + 1] = np.where(avg_loss > 0, rsi, 100)
+    return out
+
+
+def volume_ratio_matrix(volumes, lookback=VOL_LOOKBACK):
+    """volume / trung bình `lookback` phiên trước đó (không gồm phiên hiện tại)"""
+    out = np.full(volumes.shape, np.nan)
+    csum = np.cumsum(np.pad(volumes, ((0, 0), (1, 0))), axis=1)
+    avg = (csum[:, lookback:-1] - csum[:, :-lookback - 1]) / lookback
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, lookback:] = volumes[:, lookback:] / avg
+    return out
+
+
+def swing_points(values, width=SWING_WIDTH, kind="low"):
+    """Đánh dấu đáy (kind='low') hoặc đỉnh (kind='high') cục bộ trong +-width phiên"""
+    mask = np.zeros(values.shape, dtype=bool)
+    if values.shape[1] < 2 * width + 1:
+        return mask
+    windows = sliding_window_view(values, 2 * width + 1, axis=1)
+    center = windows[:, :, width]
+    if kind == "low":
+        is_swing = (center <= windows.min(axis=2)) & (center < windows[:, :, :width].min(axis=2))
+    else:
+        is_swing = (center >= windows.max(axis=2)) & (center > windows[:, :, :width].max(axis=2))
+    mask[:, width:values.shape[1] - width] = is_swing
+    return mask
+
+
+def last_two(mask, values):
+    """Giá trị tại 2 điểm True cuối cùng mỗi hàng -> (trước, sau); NaN nếu không đủ"""
+    idx = np.where(mask, np.arange(mask.shape[1]), -1)
+    last = idx.max(axis=1)
+    idx[np.arange(len(idx)), np.maximum(last, 0)] = -1
+    prev = idx.max(axis=1)
+    pick = lambda i: np.where(i >= 0, np.take_along_axis(values, np.maximum(i, 0)[:, None], axis=1)[:, 0], np.nan)
+    return pick(prev), pick(last)
+
+
+def trailing_run(mask):
+    """Số phiên True liên tiếp tính từ cuối mỗi hàng"""
+    return np.cumprod(mask[:, ::-1], axis=1).sum(axis=1)
+
+
+def slope(series, lookback=SLOPE_LOOKBACK):
+    """Độ dốc tương đối của series trong `lookback` phiên cuối"""
+    return series[:, -1] / series[:, -1 - lookback] - 1
+
+
+def _field(candles, field):
+    """Mảng 1 cột từ CandleRingBuffer (view, không copy) hoặc list dict nến"""
+    if isinstance(candles, CandleRingBuffer):
+        return candles.view(field)
+    return np.array([float(c[field]) for c in candles])
+
+
+def build_matrices(symbols, candles_by_symbol, drop_last=True):
+    """
+    Xếp nến của các mã (list dict hoặc CandleRingBuffer) thành ma trận (mã x phiên), mỗi ma trận
+    gồm các mã cùng độ dài lịch sử. Không cắt mã dài theo mã ngắn nhất: EMA/RSI của mỗi mã chỉ
+    phụ thuộc nến của chính nó, không phụ thuộc mã nào khác có mặt trong universe.
+    drop_last: bỏ nến cuối (phiên đang chạy), giống data[-2] trong các báo cáo.
+    Trả về list (symbols, {field: ma trận}).
+    """
+    groups = {}
+    for symbol in symbols:
+        candles = candles_by_symbol.get(symbol)
+        if candles is not None and len(candles) - drop_last >= MIN_BARS:
+            groups.setdefault(len(candles) - drop_last, []).append(symbol)
+
+    matrices = []
+    for length, group in groups.items():
+        matrix = {
+            field: np.array([_field(candles_by_symbol[symbol], field)[:length] for symbol in group])
+            for field in ("close", "high", "low", "volume")
+        }
+        matrices.append((group, matrix))
+    return matrices
+
+
+def evaluate_checks(close, high, low, volume):
+    """
+    Các điều kiện trend leader / down leader trên ma trận (mã x phiên) cùng độ dài.
+    Trả về (leader_checks, down_checks, move, high_vol_count), mỗi giá trị là mảng theo mã.
+    """
+    rows = np.arange(close.shape[0])
+    ema50 = ema_matrix(close, 50)
+    ema90 = ema_matrix(close, 90)
+    macd = ema_matrix(close, 12) - ema_matrix(close, 26)
+    rsi = rsi_matrix(close)
+    vol_ratio = volume_ratio_matrix(volume)
+
+    # Vol cao >= 5 phiên trong 10 phiên gần nhất, tính từ phiên vol cao đầu tiên
+    recent_high_vol = vol_ratio[:, -VOL_WINDOW:] >= VOL_RATIO_HIGH
+    high_vol_count = recent_high_vol.sum(axis=1)
+    vol_start = np.argmax(recent_high_vol, axis=1)
+    sessions_since_start = VOL_WINDOW - vol_start
+    start_close = close[rows, close.shape[1] - VOL_WINDOW + vol_start]
+    move = close[:, -1] / start_close - 1
+
+    # Giá giữ trên EMA50 kể từ khi vol bắt đầu
+    above_ema50 = trailing_run(close > ema50) >= sessions_since_start
+
+    prev_low, last_low = last_two(swing_points(low, kind="low"), low)
+    prev_high, last_high = last_two(swing_points(high, kind="high"), high)
+
+    rsi_recent = rsi[:, -RSI_LOOKBACK:]
+    rsi_recovered = (np.nanmin(rsi_recent, axis=1) < 40) & (trailing_run(rsi_recent > 50) >= RSI_HOLD_SESSIONS)
+
+    leader_checks = {
+        "high_volume": high_vol_count >= VOL_MIN_SESSIONS,
+        "above_ema50": above_ema50,
+        "move": (move >= MOVE_MIN) & (move <= MOVE_MAX),
+        "ema50_up": slope(ema50) > EMA50_SLOPE_MIN,
+        "ema90_flat": np.abs(slope(ema90)) < EMA90_FLAT_MAX,
+        "higher_low": last_low > prev_low,
+        "rsi_recovered": rsi_recovered,
+    }
+
+    # Down leader: đỉnh sau thấp hơn, đáy sau thấp hơn, MACD âm, RSI 3x-4x,
+    # thiếu vol - vol cao chủ yếu ở phiên giảm
+    down_close = np.diff(close[:, -VOL_WINDOW - 1:], axis=1) < 0
+    rsi_tail = rsi[:, -DOWN_RSI_SESSIONS:]
+    down_checks = {
+        "lower_high": last_high < prev_high,
+        "lower_low": last_low < prev_low,
+        "macd_negative": macd[:, -1] < 0,
+        "rsi_30_50": ((rsi_tail >= DOWN_RSI_LOW) & (rsi_tail < DOWN_RSI_HIGH)).all(axis=1),
+        "volume_on_down": (recent_high_vol & down_close).sum(axis=1) > (recent_high_vol & ~down_close).sum(axis=1),
+        "low_volume": high_vol_count < VOL_MIN_SESSIONS,
+    }
+    return leader_checks, down_checks, move, high_vol_count
+
+
+def detect_trend_leaders(symbols, candles_by_symbol):
+    """
+    Đánh giá toàn bộ universe, một lần duyệt mảng cho mỗi nhóm mã cùng độ dài lịch sử.
+    Trả về {symbol: {"label": "leader" | "down_leader" | "", "move": float, "checks": {...}}}
+    """
+    results = {}
+    for used, m in build_matrices(symbols, candles_by_symbol):
+        leader_checks, down_checks, move, high_vol_count = evaluate_checks(m["close"], m["high"], m["low"], m["volume"])
+        is_leader = np.logical_and.reduce(list(leader_checks.values()))
+        is_down_leader = np.logical_and.reduce(list(down_checks.values()))
+
+        for i, symbol in enumerate(used):
+            checks = leader_checks if is_leader[i] or not is_down_leader[i] else down_checks
+            results[symbol] = {
+                "label": "leader" if is_leader[i] else "down_leader" if is_down_leader[i] else "",
+                "move": float(move[i]) if high_vol_count[i] else 0.0,
+                "checks": {name: bool(values[i]) for name, values in checks.items()},
+            }
+    return {symbol: results[symbol] for symbol in symbols if symbol in results}
+
+
+def format_leader_report(results):
+    """Tạo đoạn báo cáo trend leader / down leader để nối vào báo cáo tổng hợp"""
+    leaders = [s for s, r in results.items() if r["label"] == "leader"]
+    down_leaders = [s for s, r in results.items() if r["label"] == "down_leader"]
+    if not leaders and not down_leaders:
+        return ""
+
+    message = ""
+    if leaders:
+        details = ", ".join(f"{s} (+{results[s]['move'] * 100:.1f}%)" for s in leaders)
+        message += f"<b>🟢 Trend Leaders:</b> {details}\n"
+    if down_leaders:
+        message += f"<b>🔴 Down Trend Leaders:</b> {', '.join(down_leaders)}\n"
+    return message
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from service.candle_buffer import CandleRingBuffer, SourceBuffers
+
+HOUR = 3600
+
+
+def candle(hour, close, source="cryptocompare"):
+    return {"timestamp": f"2025-01-01 {hour:02d}:00:00", "open": close, "high": close, "low": close,
+            "close": close, "volume": 1.0, "source": source}
+
+
+def test_ring_buffer_keeps_last_capacity_candles_in_order():
+    buffer = CandleRingBuffer("BTCUSDT", 3)
+    buffer.extend([candle(h, h) for h in range(5)])
+
+    assert list(buffer.view("close")) == [2, 3, 4]
+    assert [r["timestamp"][11:13] for r in buffer.to_rows(tail=2)] == ["03", "04"]
+
+
+def test_same_timestamp_overwrites_and_older_is_ignored():
+    buffer = CandleRingBuffer("BTCUSDT", 3)
+    buffer.extend([candle(1, 1), candle(2, 2), candle(2, 5), candle(0, 9)])
+
+    assert list(buffer.view("close")) == [1, 5]
+
+
+def test_buffer_tracks_source_and_clear_resets_it():
+    buffer = CandleRingBuffer("BTCUSDT", 3)
+    buffer.extend([candle(1, 1), candle(2, 2)])
+    assert buffer.source == "cryptocompare"
+
+    buffer.clear()
+    assert len(buffer) == 0 and buffer.source is None
+    buffer.extend([candle(3, 3, "binance")])
+    assert buffer.source == "binance"
+    assert list(buffer.view("close")) == [3]
+
+
+def test_snapshot_is_unaffected_by_later_writes():
+    buffer = CandleRingBuffer("BTCUSDT", 3)
+    buffer.extend([candle(1, 1), candle(2, 2)])
+    snapshot = buffer.snapshot()
+    buffer.extend([candle(2, 7), candle(3, 3), candle(4, 4)])
+
+    assert list(snapshot.view("close")) == [1, 2]
+    assert list(buffer.view("close")) == [7, 3, 4]
+
+
+def epoch(hour):
+    return datetime(2025, 1, 1, hour).timestamp()
+
+
+def test_winning_source_delta_goes_to_its_own_buffer():
+    buffers = SourceBuffers("BTCUSDT", 4)
+    assert buffers.missing_bars(HOUR) == 4
+    buffers.add([candle(h, h) for h in range(4)], HOUR)
+    buffers.add([candle(h, 10 + h, "binance") for h in range(4)], HOUR)
+    assert buffers.active == "binance"
+
+    # Nguồn chính thắng lại với delta ngắn: nối vào buffer của nó, không trộn volume 2 nguồn
+    buffer = buffers.add([candle(3, 3), candle(4, 4)], HOUR)
+    assert buffers.active == "cryptocompare"
+    assert list(buffer.view("close")) == [1, 2, 3, 4]
+    assert list(buffers.get("binance").view("close")) == [10, 11, 12, 13]
+
+
+def test_delta_that_does_not_connect_needs_backfill():
+    buffers = SourceBuffers("BTCUSDT", 4)
+    buffers.add([candle(h, h) for h in range(4)], HOUR)
+
+    assert buffers.add([candle(3, 3, "binance"), candle(4, 4, "binance")], HOUR) is None
+    assert buffers.active == "cryptocompare"
+    assert len(buffers.get("binance")) == 0
+
+
+def test_missing_bars_covers_lagging_source_buffers():
+    buffers = SourceBuffers("BTCUSDT", 10)
+    buffers.add([candle(h, h, "binance") for h in range(10)], HOUR)
+    buffers.add([candle(h, h) for h in range(10)], HOUR)
+    buffers.add([candle(h, h) for h in range(9, 14)], HOUR)
+
+    # buffer binance chậm 4 nến so với buffer đang dùng: delta đủ dài để nguồn nào thắng cũng nối được
+    assert buffers.missing_bars(HOUR, now=epoch(13)) == 5
+    # chậm quá MAX_LAG_BARS thì bỏ qua, nguồn đó thắng sẽ backfill
+    assert buffers.missing_bars(HOUR, now=epoch(21)) == 9
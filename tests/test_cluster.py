@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from cluster.coordination import create_backend
+from cluster.node import ClusterNode, WorkerPool
+
+SYMBOLS = [f"S{i}" for i in range(40)]
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return create_backend(f"sqlite://{tmp_path / 'cluster.db'}")
+    return create_backend(f"file://{tmp_path}")
+
+
+def test_nodes_split_symbols_and_rebalance_when_one_stops(backend):
+    changes = []
+    a = ClusterNode(backend, "node-a", shard_count=8, lease_ttl=30, on_change=lambda shards: changes.append(shards))
+    b = ClusterNode(backend, "node-b", shard_count=8, lease_ttl=30)
+    a.refresh()
+    b.refresh()
+    a.refresh()  # a trả các shard ring giao cho b, b nhận ở lần refresh sau
+    b.refresh()
+
+    owned_a, owned_b = set(a.owned_symbols(SYMBOLS)), set(b.owned_symbols(SYMBOLS))
+    assert owned_a and owned_b
+    assert owned_a.isdisjoint(owned_b)
+    assert owned_a | owned_b == set(SYMBOLS)
+    assert changes[0] == set(range(8)) and changes[-1] == a.owned_shards
+
+    b.stop()
+    backend.heartbeat("node-b", -1)  # node b chết: heartbeat hết hạn
+    a.refresh()
+    assert a.owned_symbols(SYMBOLS) == SYMBOLS
+
+
+def test_report_claimed_once_per_cycle(backend):
+    a = ClusterNode(backend, "node-a")
+    b = ClusterNode(backend, "node-b")
+
+    assert a.claim_report("2025-01-01 00:00:00")
+    assert not b.claim_report("2025-01-01 00:00:00")
+
+
+def test_expired_leases_are_pruned(tmp_path):
+    path = tmp_path / "cluster.db"
+    backend = create_backend(f"sqlite://{path}")
+    node = ClusterNode(backend, "node-a", shard_count=2, lease_ttl=30)
+    for i in range(5):
+        backend.acquire_lease(f"report-2025-01-0{i + 1}", "node-a", 0.01)
+    time.sleep(0.05)
+    node.refresh()
+
+    with sqlite3.connect(path) as conn:
+        names = [r[0] for r in conn.execute("SELECT name FROM leases")]
+    assert sorted(names) == ["shard-0", "shard-1"]
+
+
+def test_worker_pool_starts_new_and_stops_moved_symbols():
+    running, stopped = {}, threading.Event()
+
+    def worker(symbol, stop, delay):
+        running[symbol] = stop
+        stop.wait()
+        if symbol == "A":
+            stopped.set()
+
+    pool = WorkerPool(worker, stagger=0)
+    pool.sync(["A", "B"])
+    pool.sync(["B", "C"])
+    assert stopped.wait(2)
+    assert sorted(pool.symbols()) == ["B", "C"]
+
+    deadline = time.time() + 2
+    while len(running) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert not running["B"].is_set() and not running["C"].is_set()
+
+    pool.stop()
+    assert running["B"].is_set() and running["C"].is_set()
+    assert pool.symbols() == []
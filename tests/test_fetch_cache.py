@@ -0,0 +1,118 @@
+import threading
+import time
+
+from api.fetch_cache import SingleFlightCache, SQLiteStore
+
+
+def counting_fetch(value, delay=0.0):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(delay)
+        return value
+    return fetch, calls
+
+
+def test_concurrent_callers_share_one_fetch():
+    cache = SingleFlightCache()
+    fetch, calls = counting_fetch([{"close": 1.0}], delay=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", fetch))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [[{"close": 1.0}]] * 10
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_open_entries_expire_after_ttl_and_final_entries_do_not():
+    cache = SingleFlightCache(ttl=0.05)
+    fetch, calls = counting_fetch([1])
+    cache.get("open", fetch)
+    cache.get("closed", fetch, final=True)
+    time.sleep(0.1)
+    cache.get("open", fetch)
+    cache.get("closed", fetch, final=True)
+
+    assert len(calls) == 3
+
+
+def test_lru_evicts_oldest_entry():
+    cache = SingleFlightCache(maxsize=2)
+    fetch, calls = counting_fetch([1])
+    for key in ("a", "b", "c", "a"):
+        cache.get(key, fetch, final=True)
+
+    assert len(calls) == 4
+
+
+def test_final_entries_are_shared_through_store(tmp_path):
+    path = str(tmp_path / "kline_cache.db")
+    key = ("crypto-hedged", None, "BTC", "4h", 10, 1_700_000_000)
+    first = SingleFlightCache(store=SQLiteStore(path))
+    fetch, calls = counting_fetch([{"timestamp": "2023-11-14 20:00:00", "close": 1.5}])
+    first.get(key, fetch, final=True)
+    first.get(("open",), fetch)
+
+    # Tiến trình khác (cache trong memory rỗng) dùng chung file SQLite
+    second = SingleFlightCache(store=SQLiteStore(path))
+    assert second.get(key, fetch, final=True) == [{"timestamp": "2023-11-14 20:00:00", "close": 1.5}]
+    assert second.stats()["store_hits"] == 1
+    second.get(("open",), fetch)
+    assert len(calls) == 3
+
+
+def test_store_keeps_only_newest_entries(tmp_path):
+    store = SQLiteStore(str(tmp_path / "kline_cache.db"), max_entries=2, prune_every=4)
+    for i in range(3):
+        store.put(["k", i], [i])
+    assert store.get(["k", 0]) == [0]  # chưa tới lần dọn
+
+    store.put(["k", 3], [3])
+    assert store.get(["k", 0]) is None and store.get(["k", 1]) is None
+    assert store.get(["k", 2]) == [2] and store.get(["k", 3]) == [3]
+
+
+def test_store_file_is_created_on_first_use(tmp_path):
+    path = tmp_path / "kline_cache.db"
+    store = SQLiteStore(str(path))
+    assert not path.exists()
+
+    assert store.get(["k"]) is None
+    assert path.exists()
+
+
+def test_longer_cached_value_serves_shorter_request():
+    cache = SingleFlightCache()
+    fetch_long, long_calls = counting_fetch({"limit": 100, "candles": list(range(101))})
+    fetch_short, short_calls = counting_fetch({"limit": 10, "candles": list(range(90, 101))})
+    covers = lambda limit: lambda window: window["limit"] >= limit
+
+    cache.get("window", fetch_short, final=True, accept=covers(10))
+    cache.get("window", fetch_long, final=True, accept=covers(100))
+    assert cache.get("window", fetch_short, final=True, accept=covers(50))["limit"] == 100
+    assert len(short_calls) == 1 and len(long_calls) == 1
+
+
+def test_closed_windows_share_cache_across_limits_and_unaligned_ends(monkeypatch):
+    from api import crawlData
+    from api.hedged_fetch import HedgedFetcher
+    from api.sources import SimulatedSource
+
+    source = SimulatedSource("sim", latency=0.001, seed=1)
+    calls = []
+    fetch = source.fetch
+    monkeypatch.setattr(source, "fetch", lambda *args: calls.append(args) or fetch(*args))
+    monkeypatch.setattr(crawlData, "CRYPTO_FETCHER", HedgedFetcher([source]))
+    monkeypatch.setattr(crawlData, "KLINE_CACHE", SingleFlightCache())
+
+    end = 1_700_006_400  # mốc mở nến 4h
+    long = crawlData.fetch_klines("BTC", "4h", 100, end + 3600)
+    short = crawlData.fetch_klines("BTC", "4h", 10, end + 7200)
+
+    assert len(calls) == 1
+    assert len(long) == 101 and short == long[-11:]
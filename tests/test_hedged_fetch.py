@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from api.hedged_fetch import HedgedFetcher, MIN_SAMPLES
+from api.sources import SimulatedSource
+
+
+def p99(latencies):
+    samples = sorted(latencies)
+    return samples[min(int(len(samples) * 0.99), len(samples) - 1)]
+
+
+def timed_calls(fetcher, n):
+    latencies = []
+    for i in range(n):
+        start = time.monotonic()
+        fetcher.fetch("BTC", "4h", 10, to_timestamp=1_700_000_000 + i * 14400)
+        latencies.append(time.monotonic() - start)
+    return latencies
+
+
+def test_candles_are_tagged_with_winning_source():
+    fetcher = HedgedFetcher([SimulatedSource("primary", latency=0.01, seed=1)])
+    candles = fetcher.fetch("BTC", "4h", 10)
+
+    assert len(candles) == 11
+    assert {c["source"] for c in candles} == {"primary"}
+
+
+def test_failed_source_hedges_to_next_immediately():
+    fetcher = HedgedFetcher([
+        SimulatedSource("broken", latency=0.01, fail_rate=1.0, seed=1),
+        SimulatedSource("backup", latency=0.01, seed=2),
+    ])
+    start = time.monotonic()
+    candles = fetcher.fetch("BTC", "4h", 10)
+
+    assert candles[-1]["source"] == "backup"
+    assert time.monotonic() - start < 0.5
+    assert fetcher.stats()["broken"]["failures"] == 1
+
+
+def test_raises_when_every_source_fails():
+    fetcher = HedgedFetcher([
+        SimulatedSource("a", latency=0.01, fail_rate=1.0, seed=1),
+        SimulatedSource("b", latency=0.01, fail_rate=1.0, seed=2),
+    ])
+    with pytest.raises(TimeoutError):
+        fetcher.fetch("BTC", "4h", 10)
+
+
+def test_preferred_source_is_asked_first():
+    fetcher = HedgedFetcher([
+        SimulatedSource("fast", latency=0.005, seed=1),
+        SimulatedSource("slow", latency=0.05, seed=2),
+    ])
+    timed_calls(fetcher, MIN_SAMPLES)
+
+    assert fetcher.fetch("BTC", "4h", 10)[-1]["source"] == "fast"
+    assert fetcher.fetch("BTC", "4h", 10, prefer="slow")[-1]["source"] == "slow"
+
+
+def test_cross_validation_counts_price_mismatch():
+    fetcher = HedgedFetcher([
+        SimulatedSource("good", latency=0.01, tail_ratio=1.0, tail_latency=0.3, seed=1),
+        SimulatedSource("biased", latency=0.01, bias=0.05, seed=2),
+    ])
+    fetcher._hedge_delay = lambda source: 0.05
+    fetcher.fetch("BTC", "4h", 10)
+    time.sleep(0.5)  # request thua vẫn chạy nền rồi mới được đối chiếu
+
+    assert sum(s["mismatches"] for s in fetcher.stats().values()) == 1
+
+
+def test_hedging_cuts_tail_latency():
+    def sources():
+        return [
+            SimulatedSource("primary", latency=0.01, tail_ratio=0.05, tail_latency=0.5, seed=7),
+            SimulatedSource("secondary", latency=0.02, seed=8),
+        ]
+
+    single = timed_calls(HedgedFetcher(sources()[:1]), 100)
+    hedged_fetcher = HedgedFetcher(sources())
+    timed_calls(hedged_fetcher, MIN_SAMPLES)  # đủ mẫu latency để tính ngưỡng hedge
+    hedged = timed_calls(hedged_fetcher, 100)
+
+    assert p99(single) >= 0.5
+    assert p99(hedged) < 0.25
@@ -0,0 +1,105 @@
+import math
+import random
+from datetime import date, datetime
+
+import pytest
+
+from service.calculateData import calculate_ema, calculate_rsi
+from service.intraday import IntradaySession, IncrementalIndicators, intraday_signal, session_bucket
+
+DAY = date(2025, 12, 5)
+
+
+def at(hhmm):
+    return datetime.strptime(f"2025-12-05 {hhmm}", "%Y-%m-%d %H:%M")
+
+
+def bar(hhmm, close, volume=100.0, high=None, low=None):
+    return {"timestamp": f"2025-12-05 {hhmm}:00", "open": close, "high": high or close, "low": low or close,
+            "close": close, "volume": volume, "symbol": "FPT"}
+
+
+@pytest.mark.parametrize("hhmm, minutes, expected", [
+    ("09:00", 15, "09:00"),   # ATO
+    ("09:14", 15, "09:00"),
+    ("09:15", 15, "09:00"),   # lệnh khớp ATO lúc 09:15 thuộc nến đầu phiên
+    ("09:16", 15, "09:15"),
+    ("11:29", 60, "11:00"),
+    ("11:30", 15, "11:15"),   # bar đúng giờ nghỉ trưa -> nến cuối phiên sáng
+    ("13:00", 60, "13:00"),
+    ("14:30", 15, "14:30"),   # ATC
+    ("14:45", 15, "14:30"),
+    ("14:45", 60, "14:00"),
+])
+def test_session_bucket(hhmm, minutes, expected):
+    assert session_bucket(at(hhmm), minutes) == at(expected)
+
+
+@pytest.mark.parametrize("hhmm", ["08:59", "11:31", "12:00", "12:59", "14:46"])
+def test_bars_outside_session_have_no_bucket(hhmm):
+    assert session_bucket(at(hhmm), 15) is None
+
+
+def test_add_bars_aggregates_and_skips_lunch():
+    session = IntradaySession("FPT", DAY)
+    used = session.add_bars([bar("09:15", 100, 500), bar("09:16", 101, 10), bar("12:00", 90, 999), bar("13:00", 99, 20)])
+
+    assert used == 3
+    assert [c["timestamp"][11:16] for c in session.candles[15]] == ["09:00", "09:15", "13:00"]
+    assert session.candles[60][0]["close"] == 101 and session.candles[60][0]["volume"] == 510
+    assert session.day["volume"] == 530 and session.day["low"] == 99 and session.day["close"] == 99
+
+
+def test_refetched_last_bar_replaces_forming_bar():
+    session = IntradaySession("FPT", DAY)
+    session.add_bars([bar("09:20", 100, 10), bar("09:21", 101, 5, high=102)])
+    # Lần poll sau lấy lại từ bar cuối: bar 09:21 đã chạy tiếp, volume / high mới thay bản cũ
+    session.add_bars([bar("09:21", 99, 30, high=103, low=98), bar("09:22", 100, 1)])
+
+    assert session.candles[15][-1]["volume"] == 41
+    assert session.candles[15][-1]["high"] == 103 and session.candles[15][-1]["low"] == 98
+    assert session.day["volume"] == 41 and session.day["close"] == 100
+
+    # Bar cuối mở nến mới: thay bản cũ cũng bỏ luôn nến đó
+    session.add_bars([bar("09:30", 104, 7)])
+    session.add_bars([bar("09:30", 105, 9)])
+    assert [c["timestamp"][11:16] for c in session.candles[15]] == ["09:15", "09:30"]
+    assert session.candles[15][-1]["volume"] == 9 and session.day["volume"] == 50
+
+
+def history(n=120, seed=3):
+    walk = random.Random(seed)
+    closes = [100.0]
+    for _ in range(n - 1):
+        closes.append(closes[-1] * (1 + walk.uniform(-0.03, 0.03)))
+    return closes
+
+
+def test_incremental_indicators_match_full_recalculation():
+    closes = history()
+    indicators = IncrementalIndicators(closes, closes, closes, [1000.0] * len(closes))
+    live = {"close": closes[-1] * 1.02, "volume": 500.0}
+
+    values = indicators.update(live, at("10:00"))
+    full = closes + [live["close"]]
+    for period in (20, 50, 90):
+        assert math.isclose(values[f"ema_{period}"], calculate_ema(full, period)[-1])
+    assert math.isclose(values["rsi14"], calculate_rsi(full)[-1])
+
+
+def test_intraday_signal_fires_once_per_session():
+    closes = history()
+    indicators = IncrementalIndicators(closes, closes, closes, [1000.0] * len(closes))
+    top = indicators.high_n
+    session = IntradaySession("FPT", DAY)
+    session.add_bars([bar("09:15", top * 1.05, 5000)])
+
+    message = intraday_signal("FPT", session, indicators, at("10:30"))
+    assert "Intraday breakout" in message
+    session.add_bars([bar("10:31", top * 1.06, 100)])
+    assert intraday_signal("FPT", session, indicators, at("10:31")) == ""
+
+    # Phiên mới (session mới) được báo lại
+    next_session = IntradaySession("FPT", DAY)
+    next_session.add_bars([bar("09:15", top * 1.05, 5000)])
+    assert "Intraday breakout" in intraday_signal("FPT", next_session, indicators, at("10:30"))
@@ -0,0 +1,137 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from service.paper_trading import LONG, SHORT, PaperTrader, TradeLogStore, import_journal, parse_journal_dates
+
+
+def bar(time, close, high=None, low=None):
+    return {"timestamp": f"2025-12-05 {time}", "close": close, "high": high or close, "low": low or close}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TradeLogStore(str(tmp_path / "paper.db"))
+
+
+def trader(store):
+    return PaperTrader(store, capital=10_000, risk_per_trade=0.01, stop_pct=0.05, trail_pct=0.08)
+
+
+def test_size_risks_fixed_fraction_of_capital(store):
+    trade = trader(store).on_signal("BTC", LONG, 100.0, "2025-12-05 00:00:00")
+
+    assert trade["stop"] == pytest.approx(95.0)
+    assert trade["size"] == pytest.approx(20.0)  # chạm stop mất 20 * 5 = 100 = 1% vốn
+
+
+def test_stop_trails_best_close_and_closes_on_hit(store):
+    paper = trader(store)
+    paper.on_signal("BTC", LONG, 100.0, "2025-12-05 00:00:00")
+
+    assert paper.on_bar("BTC", bar("04:00:00", 110.0)) == []
+    trade = paper.open_positions("BTC")[0]
+    assert trade["stop"] == pytest.approx(101.2)
+    assert trade["mark_price"] == 110.0 and trade["unrealized_pnl"] == pytest.approx(200.0)
+
+    paper.on_bar("BTC", bar("08:00:00", 104.0))  # giá lùi: stop không hạ
+    assert trade["stop"] == pytest.approx(101.2)
+
+    closed = paper.on_bar("BTC", bar("12:00:00", 102.0, low=101.0))
+    assert closed == [trade] and paper.open_positions("BTC") == []
+    assert trade["exit_reason"] == "stop" and trade["exit_price"] == pytest.approx(101.2)
+    assert trade["pnl"] == pytest.approx(24.0) and trade["unrealized_pnl"] == 0.0
+
+    row = store.trades("BTC")[0]
+    assert row["status"] == "closed" and row["pnl"] == pytest.approx(24.0)
+
+
+def test_bar_updates_are_written_in_one_batch(store, monkeypatch):
+    paper = trader(store)
+    paper.on_signal("BTC", LONG, 100.0, "2025-12-05 00:00:00", "main")
+    paper.on_signal("ETH", SHORT, 100.0, "2025-12-05 00:00:00", "main")
+    batches = []
+    update = store.update_trades
+    monkeypatch.setattr(store, "update_trades", lambda trades: batches.append(len(trades)) or update(trades))
+
+    paper.on_bar("BTC", bar("04:00:00", 105.0))
+    paper.on_bar("BTC", bar("04:00:00", 105.0))  # chạy lại cùng nến: không đổi gì
+
+    assert batches == [1, 0]
+    row = store.trades("BTC")[0]
+    assert row["mark_price"] == 105.0 and row["unrealized_pnl"] == pytest.approx(100.0)
+
+
+def test_reverse_signal_closes_open_trade(store):
+    paper = trader(store)
+    long = paper.on_signal("BTC", LONG, 100.0, "2025-12-05 00:00:00")
+    assert paper.on_signal("BTC", LONG, 101.0, "2025-12-05 04:00:00") is None  # đã có lệnh cùng chiều
+
+    short = paper.on_signal("BTC", SHORT, 90.0, "2025-12-05 08:00:00")
+    assert long["status"] == "closed" and long["exit_reason"] == "reverse_signal"
+    assert long["pnl"] == pytest.approx(-200.0)
+    assert paper.open_positions("BTC") == [short]
+
+
+def test_open_trades_are_reloaded_on_restart(store):
+    paper = trader(store)
+    paper.on_signal("BTC", LONG, 100.0, "2025-12-05 00:00:00")
+    paper.on_signal("ETH", LONG, 100.0, "2025-12-05 00:00:00")
+    paper.on_bar("ETH", bar("04:00:00", 90.0, low=90.0))  # ETH chạm stop
+
+    restarted = trader(store)
+    assert [t["symbol"] for t in restarted.open_positions()] == ["BTC"]
+    # nến đã xử lý trước khi restart không bị xử lý lại
+    restarted.on_bar("BTC", bar("00:00:00", 50.0))
+    assert restarted.open_positions("BTC")[0]["status"] == "open"
+
+
+def test_old_database_gets_mark_columns(tmp_path):
+    path = str(tmp_path / "paper.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE trades (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, side TEXT, status TEXT, "
+                     "pipeline TEXT, reason TEXT, opened_at TEXT, entry_price REAL, size REAL, stop REAL, last_bar TEXT, "
+                     "closed_at TEXT, exit_price REAL, exit_reason TEXT, pnl REAL, pnl_pct REAL)")
+
+    paper = trader(TradeLogStore(path))
+    paper.on_signal("BTC", LONG, 100.0, "2025-12-05 00:00:00")
+    paper.on_bar("BTC", bar("04:00:00", 102.0))
+    assert paper.store.trades()[0]["mark_price"] == 102.0
+
+
+def test_ambiguous_journal_dates_follow_unambiguous_rows():
+    dates, notes = parse_journal_dates(["12/5/2025", "6/12/2025", "13/12/2025", pd.Timestamp("2025-12-17"), "abc"])
+
+    assert [d and d.strftime("%Y-%m-%d") for d in dates] == ["2025-12-05", "2025-12-06", "2025-12-13", "2025-12-17", None]
+    assert len(notes) == 3 and "đọc là 2025-12-05" in notes[0] and "abc" in notes[2]
+
+
+def test_ambiguous_journal_dates_without_anchor_are_day_first():
+    dates, notes = parse_journal_dates(["6/12/2025"])
+    assert dates[0].strftime("%Y-%m-%d") == "2025-12-06" and notes
+
+
+def test_import_journal_from_xlsx(tmp_path, store):
+    path = tmp_path / "trade_log.xlsx"
+    pd.DataFrame({
+        "STT": [1, 2, 3, None],
+        "Ngày giao dịch": ["12/5/2025", "13/12/2025", "??", None],
+        "Loại giao dịch": ["Bán", "mua", "Mua", None],
+        "Cặp": ["BTC/USDT", "aave/usdt", "ETH/USDT", None],
+        "Giá vào": [90800, 193.96, 3000, None],
+        "StopLoss": [None, 188.5, None, None],
+        "Giá Thoát": [88743, None, None, None],
+        "kích thước": [0.006, 0.8, 1, None],
+        "Lợi Nhuận": [12.34, None, None, None],
+        "Ghi chú": ["bán khi macd âm", None, None, None],
+    }).to_excel(path, index=False)
+
+    entries = import_journal(str(path), store)
+
+    assert [(e["symbol"], e["side"], e["opened_at"]) for e in entries] == [
+        ("BTC", SHORT, "2025-12-05 00:00:00"),
+        ("AAVE", LONG, "2025-12-13 00:00:00"),
+    ]
+    assert entries[1]["stop"] == 188.5 and entries[1]["exit_price"] is None and entries[1]["note"] == ""
+    assert len(store.journal()) == 2
@@ -0,0 +1,46 @@
+import threading
+
+from service import profiling
+from service.profiling import CycleProfiler
+
+
+def run_cycle(profiler, symbol):
+    with profiler.profile("cycle", symbol):
+        sum(range(1000))
+
+
+def test_every_n_cycles_counts_only_profiled_cycles(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_EVERY_N_CYCLES", 3)
+    profiler = CycleProfiler("test")
+    profiler.enabled = True
+    written = []
+    monkeypatch.setattr(profiler, "_write", lambda label, symbol, *args: written.append(symbol))
+
+    run_cycle(profiler, "BTC")
+    assert written == ["BTC"]
+
+    # Chu kỳ đến lượt khi đang bận profile chu kỳ khác: không tính, chu kỳ sau được profile
+    for _ in range(2):
+        run_cycle(profiler, "BTC")
+    profiler._busy.acquire()
+    run_cycle(profiler, "BTC")
+    profiler._busy.release()
+    assert written == ["BTC"]
+    run_cycle(profiler, "BTC")
+    assert written == ["BTC", "BTC"]
+
+
+def test_report_header_states_profiling_scope(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiler = CycleProfiler("test")
+    profiler.enabled = True
+
+    thread = threading.Thread(target=run_cycle, args=(profiler, "ETH"))
+    thread.start()
+    thread.join()
+
+    report = next(tmp_path.glob("test_cycle_ETH_*.txt")).read_text()
+    assert "cProfile: chỉ thread chạy chu kỳ" in report
+    assert "toàn tiến trình" in report
+    assert list(tmp_path.glob("test_cycle_ETH_*.prof"))
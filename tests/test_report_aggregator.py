@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from service.report_aggregator import CycleAggregator, format_cycle_status, utc_cycle
+
+SYMBOLS = ["A", "B", "C"]
+
+
+class Recorder:
+    def __init__(self):
+        self.reports = []
+        self.sent = threading.Event()
+
+    def __call__(self, cycle, messages, missing, stale, errors):
+        self.reports.append((cycle, dict(messages), list(missing), dict(stale), dict(errors)))
+        self.sent.set()
+
+    def wait(self, timeout=2):
+        assert self.sent.wait(timeout), "report was not sent"
+        self.sent.clear()
+
+
+def test_sends_once_when_every_symbol_reports():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 60, report)
+    for symbol in SYMBOLS:
+        aggregator.submit("2025-01-02 00:00:00", symbol, f"msg {symbol}")
+
+    assert report.reports == [("2025-01-02 00:00:00", {s: f"msg {s}" for s in SYMBOLS}, [], {}, {})]
+
+
+def test_deadline_sends_partial_report():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 0.1, report)
+    aggregator.submit("2025-01-02 00:00:00", "A", "msg A")
+    report.wait()
+
+    cycle, messages, missing, stale, errors = report.reports[0]
+    assert messages == {"A": "msg A"}
+    assert missing == ["B", "C"]
+    assert "⏳ Chưa có kết quả: B, C" in format_cycle_status(missing, stale, errors)
+
+
+def test_failed_symbol_is_listed_without_blocking_report():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 0.1, report)
+    aggregator.submit("2025-01-02 00:00:00", "A", "msg A")
+    aggregator.fail("B", ValueError("no klines"))
+    aggregator.submit("2025-01-02 00:00:00", "C", "msg C")
+    report.wait()
+
+    assert len(report.reports) == 1
+    _, _, missing, _, errors = report.reports[0]
+    assert missing == ["B"]
+    assert errors == {"B": "no klines"}
+
+
+def test_lagging_symbol_is_stale_in_current_cycle():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 0.3, report)
+    aggregator.submit("2025-01-02 00:00:00", "A", "msg A")
+    aggregator.submit("2025-01-01 00:00:00", "B", "old B")
+    aggregator.submit("2025-01-02 00:00:00", "C", "msg C")
+    report.wait()
+    assert not report.sent.wait(0.5)
+
+    assert report.reports == [
+        ("2025-01-02 00:00:00", {"A": "msg A", "C": "msg C"}, ["B"], {"B": "2025-01-01 00:00:00"}, {})
+    ]
+
+
+def test_lagging_symbol_reporting_first_is_folded_into_newer_cycle():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 0.3, report)
+    aggregator.submit("2025-01-01 00:00:00", "B", "old B")
+    aggregator.submit("2025-01-02 00:00:00", "A", "msg A")
+    aggregator.submit("2025-01-02 00:00:00", "C", "msg C")
+    report.wait()
+    assert not report.sent.wait(0.5)
+
+    assert len(report.reports) == 1
+    cycle, _, missing, stale, _ = report.reports[0]
+    assert cycle == "2025-01-02 00:00:00"
+    assert missing == ["B"]
+    assert stale == {"B": "2025-01-01 00:00:00"}
+
+
+def test_result_for_flushed_cycle_is_stale_in_next_cycle():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 60, report)
+    for symbol in SYMBOLS:
+        aggregator.submit("2025-01-01 00:00:00", symbol, "")
+    aggregator.submit("2025-01-01 00:00:00", "B", "late B")
+    aggregator.submit("2025-01-02 00:00:00", "A", "")
+    aggregator.submit("2025-01-02 00:00:00", "C", "")
+    aggregator.flush("2025-01-02 00:00:00")
+
+    assert [r[0] for r in report.reports] == ["2025-01-01 00:00:00", "2025-01-02 00:00:00"]
+    assert report.reports[1][3] == {"B": "2025-01-01 00:00:00"}
+
+
+def test_never_flushes_older_cycle_after_newer_one():
+    report = Recorder()
+    aggregator = CycleAggregator(SYMBOLS, 60, report)
+    for symbol in SYMBOLS:
+        aggregator.submit("2025-01-02 00:00:00", symbol, "")
+    aggregator._cycles["2025-01-01 00:00:00"] = {
+        "messages": {}, "stale": {}, "errors": {}, "timer": threading.Timer(60, lambda: None)
+    }
+    aggregator.flush("2025-01-01 00:00:00")
+
+    assert [r[0] for r in report.reports] == ["2025-01-02 00:00:00"]
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="cần time.tzset")
+def test_utc_cycle_is_independent_of_local_time_zone(monkeypatch):
+    keys = []
+    for tz in ("UTC", "Asia/Ho_Chi_Minh", "America/New_York"):
+        monkeypatch.setenv("TZ", tz)
+        time.tzset()
+        keys.append(utc_cycle(1766232000))
+    monkeypatch.delenv("TZ")
+    time.tzset()
+    assert keys == ["2025-12-20 12:00:00"] * 3
@@ -0,0 +1,124 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from service.calculateData import calculate_ema, calculate_rsi
+from service.trend_leader import MIN_BARS, build_matrices, detect_trend_leaders, ema_matrix, evaluate_checks, rsi_matrix
+
+
+def leader_series():
+    """Đi ngang, RSI rơi dưới 40, rồi bật lên 10-20% với vol cao và đáy sau cao hơn"""
+    close = [100 + 0.4 * math.sin(i / 2) for i in range(130)]
+    close += [100 - 0.45 * (i + 1) for i in range(10)]
+    close += [100.5, 103, 104, 103, 102.5, 103.5, 105, 107, 109, 112]
+    volume = [1000.0] * 140 + [2500.0] * 10
+    return close, volume
+
+
+def down_series():
+    """Giảm theo nhịp 3 giảm - 2 hồi, vol cao rải rác ở phiên giảm"""
+    close = [100 + 0.4 * math.sin(i / 2) for i in range(100)]
+    price = 100
+    for i in range(50):
+        price += (-1.2, -1.0, -0.9, 0.9, 1.0)[i % 5]
+        close.append(price)
+    volume = [1000.0] * 150
+    for i in range(140, 150):
+        if close[i] < close[i - 1] and i % 2 == 0:
+            volume[i] = 2500.0
+    return close, volume
+
+
+def checks(close, volume):
+    c, v = np.array([close]), np.array([volume])
+    leader, down, _, _ = evaluate_checks(c, c * 1.005, c * 0.995, v)
+    return {k: bool(x[0]) for k, x in leader.items()}, {k: bool(x[0]) for k, x in down.items()}
+
+
+def candles(close, volume):
+    # Thêm 1 nến đang chạy ở cuối (build_matrices bỏ nến cuối)
+    close, volume = list(close) + [close[-1]], list(volume) + [volume[-1]]
+    return [{"close": c, "high": c * 1.005, "low": c * 0.995, "volume": v} for c, v in zip(close, volume)]
+
+
+def test_matrix_indicators_match_scalar_versions():
+    rng = random.Random(3)
+    rows = [[100 * math.exp(sum(rng.gauss(0, 0.02) for _ in range(i))) for i in range(150)] for _ in range(3)]
+    matrix = np.array(rows)
+    for period in (12, 50, 90):
+        ema = ema_matrix(matrix, period)
+        for r, row in enumerate(rows):
+            np.testing.assert_allclose(ema[r, period - 1:], calculate_ema(row, period))
+    rsi = rsi_matrix(matrix)
+    for r, row in enumerate(rows):
+        np.testing.assert_allclose(rsi[r, 15:], calculate_rsi(row))
+
+
+def test_leader_and_down_leader_fixtures_pass_every_check():
+    leader, _ = checks(*leader_series())
+    _, down = checks(*down_series())
+    assert all(leader.values()), leader
+    assert all(down.values()), down
+
+    results = detect_trend_leaders(["UP", "DOWN", "FLAT"], {
+        "UP": candles(*leader_series()),
+        "DOWN": candles(*down_series()),
+        "FLAT": candles([100.0] * 150, [1000.0] * 150),
+    })
+    assert [results[s]["label"] for s in ("UP", "DOWN", "FLAT")] == ["leader", "down_leader", ""]
+    assert results["UP"]["move"] == pytest.approx(112 / 100.5 - 1)
+
+
+def _mutate(series, **changes):
+    close, volume = series()
+    for key, (index, values) in changes.items():
+        target = close if key == "close" else volume
+        target[index] = values
+    return close, volume
+
+
+@pytest.mark.parametrize("check, series", [
+    ("high_volume", lambda: _mutate(leader_series, volume=(slice(140, 150), [1000.0] * 10))),
+    ("move", lambda: _mutate(leader_series, close=(slice(149, 150), [125.0]))),
+    ("above_ema50", lambda: _mutate(leader_series, close=(slice(142, 143), [95.0]))),
+    ("higher_low", lambda: _mutate(leader_series, close=(slice(144, 145), [95.0]))),
+    ("rsi_recovered", lambda: _mutate(leader_series, close=(slice(130, 140), [100.0] * 10))),
+    ("ema50_up", lambda: _mutate(leader_series, close=(slice(144, 150), [100.6] * 6))),
+    ("ema90_flat", lambda: ([70 + 0.3 * i for i in range(100)] + leader_series()[0][100:], leader_series()[1])),
+])
+def test_each_leader_check_can_fail(check, series):
+    leader, _ = checks(*series())
+    assert not leader[check]
+
+
+@pytest.mark.parametrize("check, series", [
+    ("lower_high", lambda: _mutate(down_series, close=(slice(144, 145), [100.0]))),
+    ("lower_low", lambda: leader_series()),
+    ("macd_negative", lambda: leader_series()),
+    ("rsi_30_50", lambda: ([100.0] * 100 + [100 - 2 * i for i in range(50)], [1000.0] * 150)),
+    ("volume_on_down", lambda: _mutate(down_series, volume=(slice(140, 150), [1000.0, 1000.0, 1000.0, 2500.0, 2500.0] * 2))),
+    ("low_volume", lambda: _mutate(down_series, volume=(slice(140, 150), [2500.0] * 10))),
+])
+def test_each_down_leader_check_can_fail(check, series):
+    _, down = checks(*series())
+    assert not down[check]
+
+
+def test_short_history_symbol_does_not_change_other_results():
+    universe = {"UP": candles(*leader_series()), "DOWN": candles(*down_series())}
+    alone = detect_trend_leaders(["UP", "DOWN"], universe)
+
+    close, volume = leader_series()
+    universe["NEW"] = candles(close[-MIN_BARS:], volume[-MIN_BARS:])
+    together = detect_trend_leaders(["UP", "DOWN", "NEW"], universe)
+
+    assert together["UP"] == alone["UP"]
+    assert together["DOWN"] == alone["DOWN"]
+    assert "NEW" in together
+
+    # Mã lịch sử ngắn nằm ở ma trận riêng, không cắt lịch sử của UP / DOWN
+    shapes = {tuple(group): m["close"].shape for group, m in build_matrices(["UP", "DOWN", "NEW"], universe)}
+    assert shapes == {("UP", "DOWN"): (2, 150), ("NEW",): (1, MIN_BARS)}
+    np.testing.assert_array_equal(build_matrices(["UP"], universe)[0][1]["close"][0], close)